@@ -0,0 +1,47 @@
+# -*- coding: utf-8; -*-
+"""Overhead of firing GET events for resource with 0 and 20 registered hooks.
+
+Run from the repository root with ``python -m benchmarks.resource_hooks``.
+"""
+
+import timeit
+
+from events import Events
+
+from eden.resource import Resource
+from eden.services import BaseService
+
+# events fired by eve for single GET request on resource
+GET_EVENTS = (('on_pre_GET', 2), ('on_fetched_resource', 1), ('on_post_GET', 2))
+
+
+class FakeApp(Events):
+
+    def register_resource(self, name, settings):
+        pass
+
+
+def noop(*args):
+    pass
+
+
+def get_app(hooks):
+    app = FakeApp()
+    Resource('items', app=app, service=BaseService('items'))
+    slots = [(getattr(app, '%s_items' % event), (None, ) * args) for event, args in GET_EVENTS]
+    for i in range(hooks):
+        slot = slots[i % len(slots)][0]
+        slot += noop
+    return slots
+
+
+def fire(slots):
+    for slot, args in slots:
+        slot(*args)
+
+
+if __name__ == '__main__':
+    for hooks in (0, 20):
+        slots = get_app(hooks)
+        seconds = min(timeit.repeat(lambda: fire(slots), number=100000, repeat=3)) / 100000
+        print('%2d hooks: %6.2f us per GET' % (hooks, seconds * 1e6))
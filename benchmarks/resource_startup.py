@@ -0,0 +1,59 @@
+# -*- coding: utf-8; -*-
+"""Time needed to register resources, with and without compiled endpoint schema.
+
+Run from the repository root with ``python -m benchmarks.resource_startup``.
+"""
+
+import timeit
+
+from events import Events
+
+from eden.resource import Resource
+from eden.services import BaseService
+
+RESOURCES = 300
+
+
+class FakeApp(Events):
+
+    def register_resource(self, name, settings):
+        pass
+
+
+def get_resource_classes():
+    return [type('Resource%d' % i, (Resource, ), {
+        'schema': {'name': {'type': 'string'}},
+        'datasource': {'source': 'items_%d' % i},
+        'resource_methods': ['GET', 'POST'],
+        'item_methods': ['GET', 'PATCH'],
+        'etag_ignore_fields': ['_updated'],
+    }) for i in range(RESOURCES)]
+
+
+def register(classes):
+    app = FakeApp()
+    for i, resource_class in enumerate(classes):
+        name = 'items_%d' % i
+        resource_class(name, app=app, service=BaseService(name))
+
+
+def build(classes):
+    for resource_class in classes:
+        Resource._build_endpoint_schema(resource_class)
+
+
+def compiled(classes):
+    for resource_class in classes:
+        resource_class.get_endpoint_schema()
+
+
+def report(label, func, classes, number=20):
+    seconds = min(timeit.repeat(lambda: func(classes), number=number, repeat=3)) / number
+    print('%-30s %8.2f us/resource' % (label, seconds / RESOURCES * 1e6))
+
+
+if __name__ == '__main__':
+    classes = get_resource_classes()
+    report('endpoint schema (build)', build, classes)
+    report('endpoint schema (compiled)', compiled, classes)
+    report('register resources', register, classes)
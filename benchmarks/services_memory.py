@@ -0,0 +1,46 @@
+# -*- coding: utf-8; -*-
+"""Peak memory of :meth:`BaseService.find` vs :meth:`BaseService.find_iter`.
+
+Run from the repository root with ``python -m benchmarks.services_memory``.
+"""
+
+import tracemalloc
+
+from eden.services import BaseService
+
+
+class GeneratorBackend(object):
+    """Backend producing documents lazily, like a mongo cursor does."""
+
+    def __init__(self, size):
+        self.size = size
+
+    def find(self, datasource, req, where, **kwargs):
+        docs = ({'_id': i, 'body': 'x' * 256} for i in range(self.size))
+        return docs, self.size
+
+
+def peak_memory(consume, size):
+    service = BaseService('items', backend=GeneratorBackend(size))
+    tracemalloc.start()
+    consume(service)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def consume_list(service):
+    for doc in service.find(None, {}):
+        pass
+
+
+def consume_iter(service):
+    for doc in service.find_iter(None, {}):
+        pass
+
+
+if __name__ == '__main__':
+    print('%10s %14s %14s' % ('docs', 'find (KiB)', 'find_iter (KiB)'))
+    for size in (1000, 10000, 100000):
+        print('%10d %14d %14d' % (size, peak_memory(consume_list, size) / 1024,
+                                  peak_memory(consume_iter, size) / 1024))
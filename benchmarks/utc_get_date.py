@@ -0,0 +1,42 @@
+# -*- coding: utf-8; -*-
+"""Date parsing throughput for ingest like values.
+
+Run from the repository root with ``python -m benchmarks.utc_get_date``.
+"""
+
+import time
+
+import arrow
+
+from eden.utc import get_date, get_dates
+
+VALUES = 200000
+
+
+def get_date_arrow(date_or_string):
+    """Previous implementation using arrow for every value."""
+    if date_or_string:
+        return arrow.get(date_or_string).datetime
+
+
+def get_values():
+    samples = ['2019-08-%02dT10:%02d:12Z', '2019-08-%02dT10:%02d:12.123+02:00', '2019-08-%02d 10:%02d',
+               'Fri, %02d Aug 2019 10:%02d:12 GMT']
+    values = [samples[i % len(samples)] % (i % 28 + 1, i % 60) for i in range(VALUES)]
+    values[::10] = [1565358758 + i for i in range(0, VALUES, 10)]
+    return values
+
+
+def report(label, parse, values):
+    started = time.perf_counter()
+    parse(values)
+    seconds = time.perf_counter() - started
+    print('%-20s %10.0f values/s' % (label, len(values) / seconds))
+
+
+if __name__ == '__main__':
+    values = get_values()
+    arrow_values = [value for value in values if not str(value).endswith('GMT')]  # arrow can't parse RFC 1123
+    report('arrow.get', lambda values: [get_date_arrow(value) for value in values], arrow_values)
+    report('get_date', lambda values: [get_date(value) for value in values], values)
+    report('get_dates', get_dates, values)
@@ -0,0 +1,48 @@
+# -*- coding: utf-8; -*-
+"""Datetime query filtering of 1M values.
+
+Run from the repository root with ``python -m benchmarks.utc_query``.
+"""
+
+import time
+from datetime import datetime, timedelta
+
+from eden.utc import filter_datetimes, numpy, utc
+
+VALUES = 1000000
+
+
+def query_datetime_chain(datetime_value, query):
+    """Previous implementation checking operators in elif chain."""
+    if '$lte' in query and datetime_value > query['$lte']:
+        return False
+    elif '$lt' in query and datetime_value >= query['$lt']:
+        return False
+    elif '$gte' in query and datetime_value < query['$gte']:
+        return False
+    elif '$gt' in query and datetime_value <= query['$gt']:
+        return False
+    elif '$eq' in query and datetime_value != query['$eq']:
+        return False
+    elif '$ne' in query and datetime_value == query['$ne']:
+        return False
+    return True
+
+
+def report(label, filter_values, values, query):
+    started = time.perf_counter()
+    count = len(filter_values(values, query))
+    seconds = time.perf_counter() - started
+    print('%-25s %10.0f values/s, %d matched' % (label, len(values) / seconds, count))
+
+
+if __name__ == '__main__':
+    start = datetime(2019, 1, 1, tzinfo=utc)
+    values = [start + timedelta(seconds=17 * i) for i in range(VALUES)]
+    query = {'$gte': start + timedelta(days=30), '$lt': start + timedelta(days=90), '$ne': start + timedelta(days=60)}
+    report('query_datetime chain', lambda values, query: [v for v in values if query_datetime_chain(v, query)],
+           values, query)
+    report('filter_datetimes', filter_datetimes, values, query)
+    if numpy is not None:
+        array = numpy.array([v.replace(tzinfo=None) for v in values], dtype='datetime64[us]')
+        report('filter_datetimes numpy', filter_datetimes, array, query)
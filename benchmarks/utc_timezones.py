@@ -0,0 +1,39 @@
+# -*- coding: utf-8; -*-
+"""Timezone conversion of 1M timestamps spread over 40 zones.
+
+Run from the repository root with ``python -m benchmarks.utc_timezones``.
+"""
+
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from eden.utc import local_to_utc, local_to_utc_many, utc_to_local, utc_to_local_many
+
+VALUES = 1000000
+ZONES = [zone for zone in pytz.common_timezones if '/' in zone][::10][:40]
+
+
+def local_to_utc_uncached(local_tz_name, local_datetime):
+    """Previous implementation looking up timezone for every value."""
+    local_tz = pytz.timezone(local_tz_name)
+    return pytz.utc.normalize(local_tz.localize(local_datetime.replace(tzinfo=None)))
+
+
+def report(label, convert, datetimes):
+    started = time.perf_counter()
+    for zone in ZONES:
+        convert(zone, datetimes)
+    seconds = time.perf_counter() - started
+    print('%-30s %10.0f values/s' % (label, len(datetimes) * len(ZONES) / seconds))
+
+
+if __name__ == '__main__':
+    start = datetime(2010, 1, 1)
+    datetimes = [start + timedelta(minutes=17 * i) for i in range(VALUES // len(ZONES))]
+    report('local_to_utc uncached', lambda zone, values: [local_to_utc_uncached(zone, v) for v in values], datetimes)
+    report('local_to_utc', lambda zone, values: [local_to_utc(zone, v) for v in values], datetimes)
+    report('local_to_utc_many', local_to_utc_many, datetimes)
+    report('utc_to_local', lambda zone, values: [utc_to_local(zone, v) for v in values], datetimes)
+    report('utc_to_local_many', utc_to_local_many, datetimes)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8; -*-
+"""Deep comparison of nested preference documents with ~2k keys.
+
+Run from the repository root with ``python -m benchmarks.utils_deep_compare``.
+"""
+
+import copy
+import time
+
+from eden.utils import deep_compare, get_mongo_update
+
+RUNS = 200
+
+
+def deep_compare_walk(original, updates, prefix=''):
+    """Recursive diff without short-circuit, as done by hand in hooks."""
+    added, removed, modified = set(), set(), {}
+    for key, value in updates.items():
+        path = prefix + key
+        if key not in original:
+            added.add(path)
+        elif isinstance(value, dict) and isinstance(original[key], dict):
+            sub_added, sub_removed, sub_modified = deep_compare_walk(original[key], value, path + '.')
+            added |= sub_added
+            removed |= sub_removed
+            modified.update(sub_modified)
+        elif original[key] != value:
+            modified[path] = (original[key], value)
+    removed |= {prefix + key for key in original if key not in updates}
+    return added, removed, modified
+
+
+def get_preferences():
+    return {'section%d' % i: {'group%d' % j: {'key%d' % k: {'enabled': True, 'value': k, 'type': 'x'}
+                                              for k in range(10)} for j in range(10)} for i in range(20)}
+
+
+def report(label, compare, original, updates):
+    started = time.perf_counter()
+    for _ in range(RUNS):
+        compare(original, updates)
+    print('%-25s %8.3f ms' % (label, (time.perf_counter() - started) * 1000 / RUNS))
+
+
+if __name__ == '__main__':
+    original = get_preferences()
+    updates = copy.deepcopy(original)
+    updates['section3']['group4']['key5']['value'] = -1
+    updates['section7']['group1']['key2'] = {'enabled': False}
+    shared = dict(original, section3=updates['section3'], section7=updates['section7'])
+    report('walk, deep copy', deep_compare_walk, original, updates)
+    report('deep_compare, deep copy', deep_compare, original, updates)
+    report('walk, shared subtrees', deep_compare_walk, original, shared)
+    report('deep_compare, shared', deep_compare, original, shared)
+    report('get_mongo_update, shared', get_mongo_update, original, shared)
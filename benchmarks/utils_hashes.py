@@ -0,0 +1,25 @@
+# -*- coding: utf-8; -*-
+"""Password hashing throughput, serial vs hash thread pool.
+
+Run from the repository root with ``python -m benchmarks.utils_hashes``.
+"""
+
+import time
+
+from eden.utils import get_hash, get_hashes
+
+PASSWORDS = 64
+SALT = 10
+
+
+def report(label, hash_passwords, passwords):
+    started = time.perf_counter()
+    hash_passwords(passwords)
+    seconds = time.perf_counter() - started
+    print('%-15s %8.1f hashes/s' % (label, len(passwords) / seconds))
+
+
+if __name__ == '__main__':
+    passwords = ['password%d' % i for i in range(PASSWORDS)]
+    report('get_hash', lambda passwords: [get_hash(password, SALT) for password in passwords], passwords)
+    report('get_hashes', lambda passwords: get_hashes(passwords, SALT), passwords)
@@ -0,0 +1,39 @@
+# -*- coding: utf-8; -*-
+"""JSON serialization of 50k rows export with datetime and ObjectId values.
+
+Run from the repository root with ``python -m benchmarks.utils_json``.
+"""
+
+import json
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from flask import Flask
+
+from eden.utils import StreamingJSONEncoder, json_serialize_datetime_objectId
+
+ROWS = 50000
+
+
+def get_rows():
+    start = datetime(2019, 1, 1)
+    return [{'_id': ObjectId(), 'user': ObjectId(), 'name': 'row %d' % i, 'count': i,
+             '_created': start + timedelta(seconds=i // 10), '_updated': start + timedelta(seconds=i // 10),
+             'expiry': start + timedelta(days=30)} for i in range(ROWS)]
+
+
+def report(label, serialize, rows):
+    started = time.perf_counter()
+    serialize(rows)
+    print('%-25s %8.0f ms' % (label, (time.perf_counter() - started) * 1000))
+
+
+if __name__ == '__main__':
+    app = Flask(__name__)
+    app.config['DATE_FORMAT'] = '%a, %d %b %Y %H:%M:%S GMT'
+    with app.app_context():
+        rows = get_rows()
+        report('json_serialize_datetime', lambda rows: json.dumps(rows, default=json_serialize_datetime_objectId),
+               rows)
+        report('StreamingJSONEncoder', lambda rows: ''.join(StreamingJSONEncoder().iter_list(rows)), rows)
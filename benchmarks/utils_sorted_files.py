@@ -0,0 +1,43 @@
+# -*- coding: utf-8; -*-
+"""Listing of directory with 100k files sorted by modification time.
+
+Run from the repository root with ``python -m benchmarks.utils_sorted_files``.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+from eden.utils import FileSortAttributes, SortOrder, get_sorted_files
+
+FILES = 100000
+
+
+def get_sorted_files_listdir(path, sort_by, sort_order):
+    """Previous implementation using listdir and stat call for every key."""
+    files = [file for file in os.listdir(path) if os.path.isfile(os.path.join(path, file))]
+    files.sort(key=lambda file: os.path.getmtime(os.path.join(path, file)), reverse=(sort_order == SortOrder.desc))
+    return files
+
+
+def report(label, list_files):
+    started = time.perf_counter()
+    files = list_files()
+    print('%-30s %8.0f ms, %d files' % (label, (time.perf_counter() - started) * 1000, len(files)))
+
+
+if __name__ == '__main__':
+    path = tempfile.mkdtemp()
+    try:
+        for i in range(FILES):
+            filename = os.path.join(path, 'item%06d.xml' % i)
+            open(filename, 'w').close()
+            os.utime(filename, (i, (i * 7919) % FILES))
+        modified = FileSortAttributes.modified
+        report('listdir', lambda: get_sorted_files_listdir(path, modified, SortOrder.asc))
+        report('scandir', lambda: get_sorted_files(path, modified))
+        report('scandir limit=100', lambda: get_sorted_files(path, modified, limit=100))
+        report('scandir limit=100 *1.xml', lambda: get_sorted_files(path, modified, limit=100, pattern='*1.xml'))
+    finally:
+        shutil.rmtree(path)
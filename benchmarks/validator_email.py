@@ -0,0 +1,39 @@
+# -*- coding: utf-8; -*-
+"""Email validation throughput over 1M addresses.
+
+Run from the repository root with ``python -m benchmarks.validator_email``.
+"""
+
+import re
+import time
+
+from eden.validator import validate_emails
+
+ADDRESSES = 1000000
+
+REGEX = "^[a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*@" \
+        "(?:[a-z0-9](?:[a-z0-9-]*[a-z0-9])?)+(?:\\.[a-z0-9](?:[a-z0-9-]{0,4}[a-z0-9])?)*$"
+
+
+def validate_emails_regex_string(emails):
+    """Previous implementation passing regex string to ``re.match`` for every address."""
+    return [bool(re.match(REGEX, email, re.IGNORECASE)) for email in emails]
+
+
+def get_addresses():
+    samples = ['john.doe%d@example.com', 'jane_%d@mail.example.org', 'not an email %d',
+               'missing.at.%d.example.com', '@example%d.com']
+    return [samples[i % len(samples)] % i for i in range(ADDRESSES)]
+
+
+def report(label, validate, addresses):
+    started = time.perf_counter()
+    validate(addresses)
+    seconds = time.perf_counter() - started
+    print('%-25s %10.0f addresses/s' % (label, len(addresses) / seconds))
+
+
+if __name__ == '__main__':
+    addresses = get_addresses()
+    report('re.match(regex string)', validate_emails_regex_string, addresses)
+    report('validate_emails', validate_emails, addresses)
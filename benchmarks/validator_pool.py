@@ -0,0 +1,48 @@
+# -*- coding: utf-8; -*-
+"""Bulk validation time in request worker vs validation pool by payload size.
+
+Run from the repository root with ``python -m benchmarks.validator_pool``,
+the smallest size where the pool wins is a good ``VALIDATION_POOL_THRESHOLD``.
+"""
+
+import os
+import time
+
+from flask import Flask
+
+from eden.validator import get_validation_plan, validate_documents
+
+SIZES = (100, 500, 1000, 2000, 5000, 10000, 20000)
+POOL_SIZE = os.cpu_count() or 2
+
+SCHEMA = {
+    'name': {'type': 'string', 'required': True, 'minlength': 1, 'maxlength': 100},
+    'email': {'type': 'email'},
+    'phone': {'type': 'phone_number'},
+    'count': {'type': 'integer', 'min': 0},
+    'tags': {'type': 'list', 'schema': {'type': 'string'}},
+    'meta': {'type': 'dict', 'schema': {'source': {'type': 'string'}, 'score': {'type': 'float'}}},
+}
+
+
+def get_documents(size):
+    return [{'name': 'document %d' % i, 'email': 'user%d@example.com' % i, 'phone': '+44 7400 %06d' % i,
+             'count': i, 'tags': ['a', 'b', 'c'], 'meta': {'source': 'bench', 'score': i / 10}}
+            for i in range(size)]
+
+
+def measure(documents, schema, pool_size):
+    started = time.perf_counter()
+    validate_documents(documents, schema, pool_size=pool_size)
+    return time.perf_counter() - started
+
+
+if __name__ == '__main__':
+    schema = get_validation_plan(SCHEMA).local_schema
+    with Flask(__name__).app_context():
+        measure(get_documents(POOL_SIZE * 4), schema, POOL_SIZE)  # start workers
+        print('%8s %12s %12s' % ('size', 'worker ms', 'pool ms'))
+        for size in SIZES:
+            documents = get_documents(size)
+            print('%8d %12.1f %12.1f' % (size, measure(documents, schema, 0) * 1000,
+                                         measure(documents, schema, POOL_SIZE) * 1000))
@@ -0,0 +1,52 @@
+# -*- coding: utf-8; -*-
+"""Required fields check throughput for 10k documents bulk insert.
+
+It times :meth:`EdenValidator._validate_required_fields` alone, cerberus ``validate()``
+checks required fields on its own and doesn't call it.
+
+Run from the repository root with ``python -m benchmarks.validator_required``.
+"""
+
+import time
+
+from eden.validator import EdenValidator
+
+DOCUMENTS = 10000
+FIELDS = 50
+
+SCHEMA = {'field_%d' % i: {'type': 'string', 'required': i % 5 == 0} for i in range(FIELDS)}
+
+
+def validate_required_fields_scan(validator, document):
+    """Previous implementation scanning schema for every document."""
+    required = list(field for field, definition in validator.schema.items()
+                    if definition.get('required') is True)
+    missing = set(required) - set(key for key in document.keys()
+                                  if document.get(key) is not None or not validator.ignore_none_values)
+    for field in missing:
+        validator._error(field, 'required')
+
+
+def validate_required_fields_plan(validator, document):
+    validator._validate_required_fields(document)
+
+
+def get_validator():
+    validator = EdenValidator(SCHEMA, resource='benchmark', ignore_none_values=True)
+    validator._error = lambda field, error: None
+    return validator
+
+
+def report(label, validate, documents):
+    validator = get_validator()
+    started = time.perf_counter()
+    for document in documents:
+        validate(validator, document)
+    seconds = time.perf_counter() - started
+    print('%-25s %10.0f documents/s' % (label, len(documents) / seconds))
+
+
+if __name__ == '__main__':
+    documents = [{'field_%d' % i: 'value' for i in range(FIELDS) if (i + n) % 7} for n in range(DOCUMENTS)]
+    report('schema scan', validate_required_fields_scan, documents)
+    report('validation plan', validate_required_fields_plan, documents)
@@ -78,6 +78,14 @@ def register_resource(app, name, resource, service=None):
     app.eve_resources[name] = resource(name, app=app, service=service_instance)
 
 
+def get_resource_service(resource_name):
+    """Get service instance of registered resource.
+
+    :param resource_name: resource name
+    """
+    return resources[resource_name].service
+
+
 def register_jinja_filter(name, jinja_filter):
     """
     Register jinja filter
@@ -0,0 +1,135 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/eden/license
+
+"""In-process caches for read-mostly resources.
+
+Add ``eden.cache`` to ``INSTALLED_APPS`` to expose cache statistics
+on ``/cache_stats`` and to propagate invalidations to other workers
+via ``CACHE_INVALIDATION_BUS`` (see :mod:`eden.invalidation`).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from eve.utils import config
+from flask import Blueprint, jsonify
+
+from eden import signals
+
+caches = {}
+blueprint = Blueprint('cache', __name__)
+
+
+class TTLCache:
+    """Thread safe LRU cache with time to live eviction.
+
+    :param name: cache name used for stats
+    :param ttl: seconds after which entry expires, ``None`` to never expire
+    :param max_entries: max number of entries, least recently used are evicted first
+    """
+
+    def __init__(self, name, ttl=60, max_entries=10000):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        caches[name] = self
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Get value for key, ``default`` if it's missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[0] is not None and entry[0] < time.monotonic()):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return entry[1] if entry is not None else None
+
+    def evict(self, predicate):
+        """Remove all entries for which ``predicate(key, value)`` is true."""
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if predicate(key, entry[1])]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+def invalidate(cache, id=None, queries_only=False):
+    """Remove document with given id from service cache, clear it if id is not set.
+
+    Cached ``get`` results are dropped on any change as the document could match them,
+    with ``queries_only`` only these are dropped.
+    """
+    if queries_only:
+        cache.evict(lambda key, value: key[0] == 'get')
+    elif id is None:
+        cache.clear()
+    else:
+        cache.evict(lambda key, value: key[0] == 'get' or value.get(config.ID_FIELD) == id)
+
+
+def send_invalidation(cache, id=None, queries_only=False):
+    """Notify other workers that cached document has changed."""
+    signals.send('cache:invalidate', cache, resource=cache.name, id=id, queries_only=queries_only)
+
+
+@blueprint.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify({name: cache.stats() for name, cache in caches.items()})
+
+
+def init_app(app):
+    app.register_blueprint(blueprint)
+
+    bus = app.config.get('CACHE_INVALIDATION_BUS')
+    if bus:
+        from eden.invalidation import get_bus
+        app.cache_bus = get_bus(app, bus)
+        # start in process serving requests, not in master process which preloads app
+        app.before_request(app.cache_bus.start)
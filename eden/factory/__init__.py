@@ -9,4 +9,4 @@
 # AUTHORS and LICENSE files distributed with this source code, or
 # at https://www.sourcefabric.org/eden/license
 
-
+from eden.factory.app import get_app  # noqa
@@ -11,6 +11,7 @@
 
 import importlib
 import os
+import time
 
 import eve
 import jinja2
@@ -49,6 +50,34 @@ def configure_logging(app):
     )
 
 
+def init_installed_app(app, module_name, startup_profile=None):
+    """Import installed app module and call its ``init_app``.
+
+    :param app: eve app
+    :param module_name: installed app module name
+    :param startup_profile: list to append ``(module_name, import_time, init_time)`` to
+    """
+    started = time.perf_counter()
+    app_module = importlib.import_module(module_name)
+    imported = time.perf_counter()
+    init_app = getattr(app_module, 'init_app', None)
+    if init_app is None:
+        app.logger.error('App %s not initialized' % (module_name))
+    else:
+        init_app(app)
+    if startup_profile is not None:
+        startup_profile.append((module_name, imported - started, time.perf_counter() - imported))
+
+
+def format_startup_profile(startup_profile):
+    """Format startup profile as table sorted by total time."""
+    lines = ['%-40s %10s %10s %10s' % ('app', 'import ms', 'init ms', 'total ms')]
+    for module_name, import_time, init_time in sorted(startup_profile, key=lambda row: -(row[1] + row[2])):
+        lines.append('%-40s %10.1f %10.1f %10.1f' % (
+            module_name, import_time * 1000, init_time * 1000, (import_time + init_time) * 1000))
+    return '\n'.join(lines)
+
+
 def get_app(
         config=None,
         validator=EdenValidator,
@@ -114,12 +143,20 @@ def get_app(
 
    # init_celery(app)
 
+    startup_profile = [] if app.config.get('STARTUP_PROFILE') else None
     for module_name in app.config['INSTALLED_APPS']:
-        app_module = importlib.import_module(module_name)
-        try:
-            app_module.init_app(app)
-        except AttributeError:
-            app.logger.error('App %s not initialized' % (module_name))
+        init_installed_app(app, module_name, startup_profile)
+
+    lazy_installed_apps = app.config.get('LAZY_INSTALLED_APPS')
+    if lazy_installed_apps:
+        @app.before_first_request
+        def init_lazy_installed_apps():
+            lazy_profile = [] if startup_profile is not None else None
+            for module_name in lazy_installed_apps:
+                init_installed_app(app, module_name, lazy_profile)
+            if lazy_profile:
+                app.startup_profile.extend(lazy_profile)
+                app.logger.warning('Lazy apps startup profile:\n%s' % format_startup_profile(lazy_profile))
 
     for resource in eden.DOMAIN:
         app.register_resource(resource, eden.DOMAIN[resource])
@@ -134,4 +171,8 @@ def get_app(
     #     app.sentry = sentry
     #     sentry.init_app(app)
 
+    if startup_profile is not None:
+        app.startup_profile = startup_profile
+        app.logger.warning('Startup profile:\n%s' % format_startup_profile(startup_profile))
+
     return app
@@ -77,10 +77,31 @@ SENTRY_DSN = env('SENTRY_DSN', '')
 SENTRY_ERROR_LEVEL = logging.WARNING
 SENTRY_INCLUDE_PATHS = ['eden']
 
+#: ``'redis'`` to propagate cache invalidations to other workers, see :mod:`eden.invalidation`
+CACHE_INVALIDATION_BUS = env('CACHE_INVALIDATION_BUS')
+
 INSTALLED_APPS = [
     'eden.stats'
 ]
 
+#: apps imported and initialized on first request, they must not register resources or blueprints
+LAZY_INSTALLED_APPS = []
+
+#: log import and ``init_app`` time of every installed app as warning, so it is visible with default log level
+STARTUP_PROFILE = (env('EDEN_STARTUP_PROFILE', False) == 'True')
+
+#: max number of parsed phone numbers kept in memory by validator
+PHONE_NUMBER_CACHE_SIZE = 10000
+
+#: number of processes validating large bulk POST payloads, 0 to validate in request worker
+VALIDATION_POOL_SIZE = int(env('VALIDATION_POOL_SIZE', 0))
+
+#: min number of documents in POST payload validated by validation pool
+VALIDATION_POOL_THRESHOLD = int(env('VALIDATION_POOL_THRESHOLD', 5000))
+
+#: number of threads used by batch and async password hashing
+HASH_THREAD_POOL_SIZE = int(env('HASH_THREAD_POOL_SIZE', 4))
+
 RESOURCE_METHODS = ['GET', 'POST']
 ITEM_METHODS = ['GET', 'PATCH', 'PUT', 'DELETE']
 EXTENDED_MEDIA_INFO = ['content_type', 'name', 'length']
@@ -0,0 +1,181 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/eden/license
+
+"""Cache invalidation bus.
+
+Publishes ``(resource, _id)`` of every write to cached resource to other
+workers and evicts the entries they publish from local caches.
+
+Set ``CACHE_INVALIDATION_BUS`` to ``'redis'`` to use redis pub/sub via
+``app.redis`` client, or to an :class:`InvalidationBus` instance.
+
+Bus is started on first request handled by each process, so it works
+with workers forked from preloaded app.
+"""
+
+import logging
+import os
+import queue
+import threading
+from uuid import uuid4
+
+from bson import json_util
+
+from eden import signals
+from eden.cache import caches, invalidate
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidationBus:
+    """Base class for invalidation transports.
+
+    Subclasses implement :meth:`send` and :meth:`receive`.
+    """
+
+    def __init__(self):
+        self.origin = uuid4().hex
+        self.app = None
+        self._thread = None
+        self._running = False
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        """Send serialized message to other workers."""
+        raise NotImplementedError()
+
+    def receive(self, timeout):
+        """Get serialized message from other workers, ``None`` if there was none within timeout."""
+        raise NotImplementedError()
+
+    def publish(self, sender, resource, id=None, queries_only=False):
+        """Publish invalidation, used as ``cache:invalidate`` signal subscriber."""
+        self.send(json_util.dumps({'origin': self.origin, 'resource': resource, 'id': id,
+                                   'queries_only': queries_only}))
+
+    def handle(self, message):
+        """Evict entry described by message if it comes from other worker."""
+        data = json_util.loads(message)
+        if data['origin'] == self.origin:
+            return False
+        cache = caches.get(data['resource'])
+        if cache is None:
+            return False
+        with self.app.app_context():
+            invalidate(cache, data['id'], data.get('queries_only', False))
+        return True
+
+    def poll(self, timeout=0):
+        """Process pending messages, returns number of handled invalidations."""
+        handled = 0
+        message = self.receive(timeout)
+        while message is not None:
+            handled += self.handle(message)
+            message = self.receive(0)
+        return handled
+
+    def start(self):
+        """Subscribe to local invalidations and process remote ones in background thread.
+
+        It does nothing if bus is running in current process already, thread
+        of parent process is not running in forked worker so it starts a new one.
+        """
+        with self._lock:
+            if self._running and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            signals.connect('cache:invalidate', self.publish)
+            self._running = True
+            self._thread = threading.Thread(target=self._listen, name='eden-cache-bus', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        signals.blinker.signal('cache:invalidate').disconnect(self.publish)
+        self._running = False
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join()
+        self._thread = None
+
+    def _listen(self):
+        while self._running:
+            try:
+                self.poll(timeout=1)
+            except Exception:
+                logger.exception('Failed to process cache invalidation')
+
+
+class QueueBus(InvalidationBus):
+    """Bus using :class:`queue.Queue` or :class:`multiprocessing.Queue` per worker.
+
+    :param inbox: queue of this worker
+    :param outboxes: queues of other workers
+    """
+
+    def __init__(self, inbox, outboxes):
+        super().__init__()
+        self.inbox = inbox
+        self.outboxes = outboxes
+
+    def send(self, message):
+        for outbox in self.outboxes:
+            outbox.put(message)
+
+    def receive(self, timeout):
+        try:
+            if not timeout:
+                return self.inbox.get_nowait()
+            return self.inbox.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class RedisBus(InvalidationBus):
+    """Bus using redis pub/sub.
+
+    :param client: redis client, or anything providing ``publish`` and ``pubsub``
+    :param channel: pub/sub channel name
+    """
+
+    def __init__(self, client, channel='eden:cache:invalidate'):
+        super().__init__()
+        self.client = client
+        self.channel = channel
+        self.subscribe()
+
+    def subscribe(self):
+        """Subscribe to channel, forked worker can't share connection with parent so it subscribes again."""
+        self.pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(self.channel)
+        self._pubsub_pid = os.getpid()
+
+    def send(self, message):
+        self.client.publish(self.channel, message)
+
+    def receive(self, timeout):
+        if self._pubsub_pid != os.getpid():
+            self.subscribe()
+        message = self.pubsub.get_message(timeout=timeout)
+        if message is None or message.get('type') != 'message':
+            return None
+        data = message['data']
+        return data.decode('utf-8') if isinstance(data, bytes) else data
+
+
+def get_bus(app, bus):
+    """Get bus for ``CACHE_INVALIDATION_BUS`` setting value."""
+    if bus == 'redis':
+        if not getattr(app, 'redis', None):
+            raise ValueError('Redis cache invalidation bus requires app redis client')
+        bus = RedisBus(app.redis)
+    elif not isinstance(bus, InvalidationBus):
+        raise ValueError('Unknown cache invalidation bus %s' % bus)
+    bus.app = app
+    return bus
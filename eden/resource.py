@@ -1,9 +1,14 @@
 # -*- coding: utf-8; -*-
 import logging
+from types import MappingProxyType
+
 from flask import abort
 from eve.utils import config
 
 import eden
+from eden.cache import TTLCache
+from eden.services import BaseService
+from eden.utils import IUNIQUE_COLLATION
 
 log = logging.getLogger(__name__)
 
@@ -27,6 +32,106 @@ def build_custom_hateoas(hateoas, doc, **values):
 
 _METHODS = ['GET', 'HEAD', 'POST', 'PATCH', 'PUT', 'DELETE']
 
+# resource attributes copied to endpoint schema when not None
+_NOT_NONE_SETTINGS = (
+    'allowed_roles', 'allowed_item_roles', 'allow_unknown', 'additional_lookup', 'extra_response_fields',
+    'datasource', 'item_methods', 'resource_methods', 'public_methods', 'public_item_methods', 'url',
+    'item_url', 'embedded_fields', 'versioning', 'internal_resource', 'resource_title',
+)
+
+# resource attributes copied to endpoint schema when truthy
+_TRUTHY_SETTINGS = (
+    'etag_ignore_fields', 'mongo_prefix', 'auth_field', 'authentication', 'elastic_prefix',
+    'query_objectid_as_string',
+)
+
+_SCHEMA_ATTRIBUTES = frozenset(_NOT_NONE_SETTINGS + _TRUTHY_SETTINGS + ('schema', 'mongo_indexes'))
+
+# (event, service hook, resource hook) in order they are registered
+_SERVICE_HOOKS = (
+    ('on_fetched_resource_%s', 'on_fetched', 'on_pre_fetched_resource'),
+    ('on_fetched_item_%s', 'on_fetched_item', 'on_pre_fetched_item'),
+    ('on_insert_%s', 'on_create', 'on_pre_insert'),
+    ('on_inserted_%s', 'on_created', None),
+    ('on_update_%s', 'on_update', 'on_pre_update'),
+    ('on_updated_%s', 'on_updated', None),
+    ('on_delete_item_%s', 'on_delete', None),
+    ('on_deleted_item_%s', 'on_deleted', None),
+    ('on_replace_%s', 'on_replace', 'on_pre_replace'),
+    ('on_replaced_%s', 'on_replaced', None),
+)
+
+# resource hooks are only needed if service checks authorization or readonly fields are set
+_READONLY_ATTRIBUTES = {
+    'on_pre_fetched_resource': None,
+    'on_pre_fetched_item': None,
+    'on_pre_insert': 'insert_readonly',
+    'on_pre_update': 'update_readonly',
+    'on_pre_replace': 'replace_readonly',
+}
+
+_CACHE_HOOKS = [
+    ('on_inserted_%s', 'resource', 'on_cache_inserted'),
+    ('on_updated_%s', 'resource', 'on_cache_updated'),
+    ('on_replaced_%s', 'resource', 'on_cache_updated'),
+    ('on_deleted_item_%s', 'resource', 'on_cache_deleted'),
+    ('on_deleted_resource_%s', 'service', 'invalidate_cache'),
+]
+
+_SERVICE_HOOK_NAMES = frozenset(hook for _, hook, _ in _SERVICE_HOOKS) | {'is_authorized'}
+_RESOURCE_HOOK_NAMES = frozenset(_READONLY_ATTRIBUTES).union(
+    filter(None, _READONLY_ATTRIBUTES.values()),
+    ('%s_%s' % (phase, method) for phase in ('pre', 'post') for method in _METHODS))
+
+_hook_tables = {}
+
+
+def _overrides(obj, base, name):
+    return name in vars(obj) or getattr(type(obj), name) is not getattr(base, name)
+
+
+def _get_iunique_indexes(schema):
+    """Get case insensitive indexes used by ``iunique`` and ``iunique_per_parent`` rules."""
+    indexes = {}
+    for field, definition in (schema or {}).items():
+        if definition.get('iunique'):
+            indexes['%s_iunique' % field] = ([(field, 1)], {'collation': IUNIQUE_COLLATION})
+        if definition.get('iunique_per_parent'):
+            keys = [(definition['iunique_per_parent'], 1), (field, 1)]
+            indexes['%s_iunique_per_parent' % field] = (keys, {'collation': IUNIQUE_COLLATION})
+    return indexes
+
+
+def _compile_fields(fields):
+    """Split field names into frozenset of top level fields and tuple of dotted paths."""
+    fields = fields or ()
+    return (frozenset(field for field in fields if '.' not in field),
+            tuple(tuple(field.split('.')) for field in fields if '.' in field))
+
+
+def _strip_path(value, path):
+    if isinstance(value, dict):
+        if len(path) == 1:
+            value.pop(path[0], None)
+        elif path[0] in value:
+            _strip_path(value[path[0]], path[1:])
+    elif isinstance(value, list):
+        for item in value:
+            _strip_path(item, path)
+
+
+def strip_fields(docs, fields):
+    """Remove fields compiled by :func:`_compile_fields` from all docs in single pass.
+
+    Nested fields use dotted path, lists on the path are handled item by item.
+    """
+    top_level, paths = fields
+    for doc in docs:
+        for key in top_level:
+            doc.pop(key, None)
+        for path in paths:
+            _strip_path(doc, path)
+
 
 class Resource:
     '''
@@ -64,127 +169,124 @@ class Resource:
     replace_readonly: list = None  # fields that should be readonly on edit
     allowed_roles = None
     allowed_item_roles = None
+    cache = None  # eg. {'ttl': 60, 'max_entries': 10000} to cache service reads in process
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._compile_readonly()
+
+    @classmethod
+    def _compile_readonly(cls):
+        cls._readonly = {name: (getattr(cls, name), _compile_fields(getattr(cls, name)))
+                         for name in ('insert_readonly', 'update_readonly', 'replace_readonly')}
+
+    def _get_readonly(self, name):
+        fields, compiled = self._readonly[name]
+        current = getattr(self, name)
+        return compiled if current is fields else _compile_fields(current)
 
     def __init__(self, endpoint_name, app, service, endpoint_schema=None):
         self.endpoint_name = endpoint_name
         self.service = service
         if not endpoint_schema:
-            endpoint_schema = {'schema': self.schema}
-            if self.allowed_roles is not None:
-                endpoint_schema.update({'allowed_roles': self.allowed_roles})
-            if self.allowed_item_roles is not None:
-                endpoint_schema.update({'allowed_item_roles': self.allowed_item_roles})
-            if self.allow_unknown is not None:
-                endpoint_schema.update({'allow_unknown': self.allow_unknown})
-            if self.additional_lookup is not None:
-                endpoint_schema.update({'additional_lookup': self.additional_lookup})
-            if self.extra_response_fields is not None:
-                endpoint_schema.update({'extra_response_fields': self.extra_response_fields})
-            if self.datasource is not None:
-                endpoint_schema.update({'datasource': self.datasource})
-            if self.item_methods is not None:
-                endpoint_schema.update({'item_methods': self.item_methods})
-            if self.resource_methods is not None:
-                endpoint_schema.update({'resource_methods': self.resource_methods})
-            if self.public_methods is not None:
-                endpoint_schema.update({'public_methods': self.public_methods})
-            if self.public_item_methods is not None:
-                endpoint_schema.update({'public_item_methods': self.public_item_methods})
-            if self.url is not None:
-                endpoint_schema.update({'url': self.url})
-            if self.item_url is not None:
-                endpoint_schema.update({'item_url': self.item_url})
-            if self.embedded_fields is not None:
-                endpoint_schema.update({'embedded_fields': self.embedded_fields})
-            if self.versioning is not None:
-                endpoint_schema.update({'versioning': self.versioning})
-            if self.internal_resource is not None:
-                endpoint_schema.update({'internal_resource': self.internal_resource})
-            if self.resource_title is not None:
-                endpoint_schema.update({'resource_title': self.resource_title})
-            if self.etag_ignore_fields:
-                endpoint_schema.update({'etag_ignore_fields': self.etag_ignore_fields})
-            if self.mongo_prefix:
-                endpoint_schema.update({'mongo_prefix': self.mongo_prefix})
-            if self.auth_field:
-                endpoint_schema.update({'auth_field': self.auth_field})
-            if self.authentication:
-                endpoint_schema.update({'authentication': self.authentication})
-            if self.elastic_prefix:
-                endpoint_schema.update({'elastic_prefix': self.elastic_prefix})
-            if self.query_objectid_as_string:
-                endpoint_schema.update({'query_objectid_as_string': self.query_objectid_as_string})
-            if self.mongo_indexes:
-                # used in app:initialize_data
-                endpoint_schema['mongo_indexes__init'] = self.mongo_indexes
+            if _SCHEMA_ATTRIBUTES.intersection(vars(self)):
+                endpoint_schema = self._build_endpoint_schema(self)
+            else:
+                endpoint_schema = self.get_endpoint_schema()
 
         self.endpoint_schema = endpoint_schema
 
-        on_fetched_resource = getattr(app, 'on_fetched_resource_%s' % self.endpoint_name)
-        on_fetched_resource -= service.on_fetched
-        on_fetched_resource += service.on_fetched
-
-        on_fetched_resource -= self.on_pre_fetched_resource
-        on_fetched_resource += self.on_pre_fetched_resource
-
-        on_fetched_item = getattr(app, 'on_fetched_item_%s' % self.endpoint_name)
-        on_fetched_item -= service.on_fetched_item
-        on_fetched_item += service.on_fetched_item
-
-        on_fetched_item -= self.on_pre_fetched_item
-        on_fetched_item += self.on_pre_fetched_item
-
-        on_insert_event = getattr(app, 'on_insert_%s' % self.endpoint_name)
-        on_insert_event -= service.on_create
-        on_insert_event += service.on_create
-
-        on_insert_event -= self.on_pre_insert
-        on_insert_event += self.on_pre_insert
-
-        on_inserted_event = getattr(app, 'on_inserted_%s' % self.endpoint_name)
-        on_inserted_event -= service.on_created
-        on_inserted_event += service.on_created
-
-        on_update_event = getattr(app, 'on_update_%s' % self.endpoint_name)
-        on_update_event -= service.on_update
-        on_update_event += service.on_update
+        if self.cache and service.cache is None:
+            service.cache = TTLCache(self.endpoint_name, **self.cache)
 
-        on_update_event -= self.on_pre_update
-        on_update_event += self.on_pre_update
+        hooks = self._get_hook_table(service)
+        if service.cache is not None:
+            hooks += _CACHE_HOOKS
 
-        on_updated_event = getattr(app, 'on_updated_%s' % self.endpoint_name)
-        on_updated_event -= service.on_updated
-        on_updated_event += service.on_updated
+        for event_name, target, hook_name in hooks:
+            on_event = getattr(app, event_name % self.endpoint_name)
+            event_hook = getattr(service if target == 'service' else self, hook_name)
+            on_event -= event_hook
+            on_event += event_hook
 
-        on_delete_event = getattr(app, 'on_delete_item_%s' % self.endpoint_name)
-        on_delete_event -= service.on_delete
-        on_delete_event += service.on_delete
-
-        on_deleted_event = getattr(app, 'on_deleted_item_%s' % self.endpoint_name)
-        on_deleted_event -= service.on_deleted
-        on_deleted_event += service.on_deleted
+        app.register_resource(self.endpoint_name, endpoint_schema)
+        eden.resources[self.endpoint_name] = self
 
-        on_replace_event = getattr(app, 'on_replace_%s' % self.endpoint_name)
-        on_replace_event -= service.on_replace
-        on_replace_event += service.on_replace
+    @classmethod
+    def get_endpoint_schema(cls):
+        """Get endpoint schema for resource class.
 
-        on_replace_event -= self.on_pre_replace
-        on_replace_event += self.on_pre_replace
+        It's computed once per class and reused by later registrations,
+        a shallow copy is returned as eve adds defaults to it.
+        """
+        compiled = cls.__dict__.get('_compiled_endpoint_schema')
+        if compiled is None:
+            compiled = MappingProxyType(cls._build_endpoint_schema(cls))
+            cls._compiled_endpoint_schema = compiled
+        return dict(compiled)
 
-        on_replaced_event = getattr(app, 'on_replaced_%s' % self.endpoint_name)
-        on_replaced_event -= service.on_replaced
-        on_replaced_event += service.on_replaced
+    @staticmethod
+    def _build_endpoint_schema(resource):
+        endpoint_schema = {'schema': resource.schema}
+        for key in _NOT_NONE_SETTINGS:
+            value = getattr(resource, key)
+            if value is not None:
+                endpoint_schema[key] = value
+        for key in _TRUTHY_SETTINGS:
+            value = getattr(resource, key)
+            if value:
+                endpoint_schema[key] = value
+        mongo_indexes = _get_iunique_indexes(resource.schema)
+        if resource.mongo_indexes:
+            mongo_indexes.update(resource.mongo_indexes)
+        if mongo_indexes:
+            # used in app:initialize_data
+            endpoint_schema['mongo_indexes__init'] = mongo_indexes
+        return endpoint_schema
+
+    def _get_hook_table(self, service):
+        """Get ``(event, target, hook)`` list of hooks overridden by resource or service.
+
+        Hooks left as no-op are not registered at all, so events without custom hooks
+        cost nothing. The table is computed once per resource and service class.
+        """
+        key = (type(self), type(service))
+        overridden_on_instance = _SERVICE_HOOK_NAMES.intersection(vars(service))
+        overridden_on_instance |= _RESOURCE_HOOK_NAMES.intersection(vars(self))
+        cacheable = not overridden_on_instance
+        if cacheable and key in _hook_tables:
+            return list(_hook_tables[key])
+
+        hooks = []
+        authorizes = _overrides(service, BaseService, 'is_authorized')
+        for event_name, service_hook, resource_hook in _SERVICE_HOOKS:
+            if _overrides(service, BaseService, service_hook):
+                hooks.append((event_name, 'service', service_hook))
+            if not resource_hook:
+                continue
+            readonly = _READONLY_ATTRIBUTES[resource_hook]
+            if authorizes or _overrides(self, Resource, resource_hook) or (readonly and getattr(self, readonly)):
+                hooks.append((event_name, 'resource', resource_hook))
 
         # hook in our pre and post processors
         for phase in ('pre', 'post'):
             for method in _METHODS:
-                on_event = getattr(app, 'on_%s_%s_%s' % (phase, method, self.endpoint_name))
-                event_hook = getattr(self, phase + '_' + method)
-                on_event -= event_hook
-                on_event += event_hook
+                hook_name = phase + '_' + method
+                if _overrides(self, Resource, hook_name):
+                    hooks.append(('on_' + hook_name + '_%s', 'resource', hook_name))
 
-        app.register_resource(self.endpoint_name, endpoint_schema)
-        eden.resources[self.endpoint_name] = self
+        if cacheable:
+            _hook_tables[key] = tuple(hooks)
+        return hooks
+
+    def on_cache_inserted(self, docs):
+        self.service.invalidate_cache(queries_only=True)
+
+    def on_cache_updated(self, updates, original):
+        self.service.invalidate_cache(original.get(config.ID_FIELD))
+
+    def on_cache_deleted(self, doc):
+        self.service.invalidate_cache(doc.get(config.ID_FIELD))
 
     def on_pre_fetched_resource(self, docs):
         if not self.service.is_authorized("LIST", docs):
@@ -198,23 +300,19 @@ class Resource:
         if not self.service.is_authorized("POST", docs):
             abort(403, "Access to record for operation is forbidden")
         if self.insert_readonly:
-            for doc in docs:
-                for key in set(self.insert_readonly).intersection(set(doc.keys())):
-                    del doc[key]
+            strip_fields(docs, self._get_readonly('insert_readonly'))
 
     def on_pre_update(self, updates, original):
         if not self.service.is_authorized("PATCH", updates):
             abort(403, "Access to record for operation is forbidden")
         if self.update_readonly:
-            for key in set(self.update_readonly).intersection(set(updates.keys())):
-                del updates[key]
+            strip_fields((updates, ), self._get_readonly('update_readonly'))
 
     def on_pre_replace(self, document, original):
         if not self.service.is_authorized("PUT"):
             abort(403, "Access to record for operation is forbidden")
         if self.replace_readonly:
-            for key in set(self.replace_readonly).intersection(set(document.keys())):
-                del document[key]
+            strip_fields((document, ), self._get_readonly('replace_readonly'))
 
     @staticmethod
     def rel(resource, embeddable=True, required=False, type='objectid', nullable=False):
@@ -287,3 +385,6 @@ class Resource:
     @staticmethod
     def post_DELETE(request, payload):
         pass
+
+
+Resource._compile_readonly()
@@ -8,14 +8,35 @@
 # AUTHORS and LICENSE files distributed with this source code, or
 # at https://www.sourcefabric.org/superdesk/license
 
+import copy
 import logging
+from collections import Counter, defaultdict
+
+import bson
 
 from eve.methods.common import resolve_document_etag
 from eve.utils import ParsedRequest, config
-from flask import current_app as app
+from flask import current_app as app, g, has_request_context
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from eden import stats
+from eden.cache import TTLCache, invalidate, send_invalidation
+from eden.errors import EdenApiError
+from eden.utc import utcnow
+from eden.utils import ListCursor, is_same
 
 log = logging.getLogger(__name__)
 
+REQUEST_CACHE_KEY = 'eden_request_cache'
+
+#: fields, bytes and writes saved by :attr:`BaseService.minimal_patch` per datasource
+minimal_patch_stats = defaultdict(Counter)
+
+
+def _get_lookup_key(lookup):
+    return repr(sorted(lookup.items(), key=lambda item: item[0]))
+
 
 class BaseService:
     """
@@ -23,6 +44,10 @@ class BaseService:
     """
 
     datasource = None
+    delete_batch_size = None  # default page size for :meth:`delete_action`
+    request_cache = False  # memoize :meth:`find_one` results within a request
+    cache = None  # process wide :class:`eden.cache.TTLCache` for backend reads
+    minimal_patch = False  # write only fields changed by :meth:`patch`, skip write if nothing changed
 
     def __init__(self, datasource=None, backend=None):
         self.backend = backend
@@ -60,55 +85,182 @@ class BaseService:
 
     def create(self, docs, **kwargs):
         ids = self.backend.insert(self.datasource, docs, **kwargs)
+        self._invalidate_caches(queries_only=True)
         return ids
 
     def remove(self, **lookup):
-        return self.backend.remove(self.datasource, lookup)
+        res = self.backend.remove(self.datasource, lookup)
+        self._invalidate_caches()
+        return res
 
     def remove_all(self):
-        return self.backend.remove(self.datasource, {})
+        res = self.backend.remove(self.datasource, {})
+        self._invalidate_caches()
+        return res
 
     def update(self, id, updates, original):
-        return self.backend.update(self.datasource, id, updates, original)
+        res = self.backend.update(self.datasource, id, updates, original)
+        self._invalidate_caches(id)
+        return res
 
     def system_update(self, id, updates, original):
-        return self.backend.system_update(self.datasource, id, updates, original)
+        res = self.backend.system_update(self.datasource, id, updates, original)
+        self._invalidate_caches(id)
+        return res
 
     def aggregate(self, pipeline, options):
+        return list(self.aggregate_iter(pipeline, options))
+
+    def aggregate_iter(self, pipeline, options, batch_size=None):
+        """Run aggregation pipeline and yield resulting documents one by one.
+
+        :param list pipeline: aggregation pipeline
+        :param dict options: aggregation options
+        :param int batch_size: number of documents fetched from server per round-trip
+        """
+        if batch_size:
+            options = dict(options or {}, batchSize=batch_size)
         cursor = self.backend.aggregate(self.datasource, pipeline, options)
-        documents = []
-        for i, document in enumerate(cursor):
-            documents.append(document)
-        return documents
+        yield from cursor
 
     def replace(self, id, document, original):
         res = self.backend.replace(self.datasource, id, document, original)
+        self._invalidate_caches(id)
         return res
 
     def delete(self, lookup):
         res = self.backend.delete(self.datasource, lookup)
+        self._invalidate_caches()
         return res
 
+    def bulk_write(self, operations, ordered=False):
+        """Send list of pymongo write operations to datasource collection in a single request.
+
+        Operations are written as they are, callers must set ``LAST_UPDATED`` and ``ETAG``.
+
+        :param list operations: ``UpdateOne``/``ReplaceOne``/... operations
+        :param bool ordered: stop on first error if ``True``
+        """
+        collection = self._get_collection()[0]
+        try:
+            return collection.bulk_write(operations, ordered=ordered)
+        finally:
+            # some operations could be written even if it failed
+            self._invalidate_caches()
+
+    def _get_collection(self):
+        """Get pymongo collection and base filter of datasource."""
+        source, filter_, _, _ = self.backend.datasource(self.datasource)
+        return self.backend.pymongo(self.datasource).db[source], filter_
+
     def delete_ids_from_mongo(self, ids):
         res = self.backend.delete_ids_from_mongo(self.datasource, ids)
+        self._invalidate_caches()
         return res
 
     def find_one(self, req, **lookup):
+        cache = self._get_request_cache() if req is None else None
+        if cache is None:
+            return self._find_one(req, **lookup)
+
+        entries = cache['entries'].setdefault(self.datasource, {})
+        key = _get_lookup_key(lookup)
+        if key in entries:
+            cache['hits'] += 1
+            return copy.deepcopy(entries[key])
+
+        cache['misses'] += 1
+        res = self._find_one(req, **lookup)
+        if res is not None:
+            # callers can modify returned document, keep the cached one intact
+            entries[key] = copy.deepcopy(res)
+        return res
+
+    def _find_one(self, req, **lookup):
+        if self.cache is None or req is not None:
+            return self.backend.find_one(self.datasource, req=req, **lookup)
+        key = ('find_one', _get_lookup_key(lookup))
+        res = self.cache.get(key)
+        if res is not None:
+            return copy.deepcopy(res)
         res = self.backend.find_one(self.datasource, req=req, **lookup)
+        if res is not None:
+            self.cache.set(key, copy.deepcopy(res))
         return res
 
+    @staticmethod
+    def request_cache_stats():
+        """Get ``find_one`` request cache hits and misses for current request."""
+        cache = g.get(REQUEST_CACHE_KEY) if has_request_context() else None
+        if cache is None:
+            return {'hits': 0, 'misses': 0}
+        return {'hits': cache['hits'], 'misses': cache['misses']}
+
+    def _get_request_cache(self):
+        if not self.request_cache or not has_request_context():
+            return None
+        cache = g.get(REQUEST_CACHE_KEY)
+        if cache is None:
+            cache = {'hits': 0, 'misses': 0, 'entries': {}}
+            setattr(g, REQUEST_CACHE_KEY, cache)
+        return cache
+
+    def _invalidate_caches(self, id=None, queries_only=False):
+        """Drop cached documents with given id, or all documents of datasource if id is not set.
+
+        It must be called after the write, otherwise a concurrent read could cache the old document again.
+        With ``queries_only`` only cached ``get`` results are dropped, inserted documents can't be cached yet.
+        """
+        if self.cache is not None:
+            invalidate(self.cache, id, queries_only)
+            send_invalidation(self.cache, id, queries_only)
+
+        cache = g.get(REQUEST_CACHE_KEY) if has_request_context() else None
+        if queries_only or not cache or self.datasource not in cache['entries']:
+            return
+        if id is None:
+            del cache['entries'][self.datasource]
+            return
+        entries = cache['entries'][self.datasource]
+        for key in [key for key, doc in entries.items() if doc.get(config.ID_FIELD) == id]:
+            del entries[key]
+
+    def invalidate_cache(self, id=None, queries_only=False):
+        """Remove document with given id from caches, clear them if id is not set.
+
+        :param queries_only: drop only cached ``get`` results, eg. after insert
+        """
+        self._invalidate_caches(id, queries_only)
+
     def find(self, req, where, **kwargs):
         """Find items in service collection using mongo query.
 
         :param dict where:
         """
+        return list(self.find_iter(req, where, **kwargs))
+
+    def find_iter(self, req, where, batch_size=None, **kwargs):
+        """Find items in service collection using mongo query and yield them lazily.
+
+        Documents are fetched from backend cursor as they are consumed,
+        so memory usage does not grow with the size of the result.
+
+        :param dict where:
+        :param int batch_size: number of documents fetched from server per round-trip
+        """
         cursor, count = self.backend.find(self.datasource, req, where, **kwargs)
-        documents = []
-        for i, document in enumerate(cursor):
-            documents.append(document)
-        return documents
+        if batch_size and hasattr(cursor, 'batch_size'):
+            cursor = cursor.batch_size(batch_size)
+        yield from cursor
 
     def get(self, req, lookup):
+        if req is None and self.cache is not None:
+            key = ('get', _get_lookup_key(lookup or {}))
+            docs = self.cache.get(key)
+            if docs is None:
+                docs = list(self.backend.get(self.datasource, req=ParsedRequest(), lookup=lookup))
+                self.cache.set(key, docs)
+            return ListCursor(copy.deepcopy(docs))
         if req is None:
             req = ParsedRequest()
         return self.backend.get(self.datasource, req=req, lookup=lookup)
@@ -120,6 +272,7 @@ class BaseService:
 
     def find_and_modify(self, **kwargs):
         res = self.backend.find_and_modify(self.datasource, **kwargs)
+        self._invalidate_caches()
         return res
 
     def post(self, docs, **kwargs):
@@ -130,30 +283,170 @@ class BaseService:
 
     def patch(self, id, updates):
         original = self.find_one(req=None, _id=id)
-        updated = original.copy()
-        self.on_update(updates, original)
-        updated.update(updates)
-        if config.IF_MATCH:
-            resolve_document_etag(updated, self.datasource)
-            updates[config.ETAG] = updated[config.ETAG]
+        if not self._prepare_patch(updates, original):
+            return None
         res = self.update(id, updates, original)
         self.on_updated(updates, original)
         return res
 
     def put(self, id, document):
         original = self.find_one(req=None, _id=id)
-        self.on_replace(document, original)
-        resolve_document_etag(document, self.datasource)
+        self._prepare_put(document, original)
         res = self.replace(id, document, original)
         self.on_replaced(document, original)
         return res
 
-    def delete_action(self, lookup=None):
+    def patch_many(self, updates_by_id):
+        """Patch many documents using single read and single write round-trip.
+
+        Originals are fetched with one ``$in`` query, ``on_update`` and ``on_updated``
+        hooks run per document and all updates are sent via single ``bulk_write``.
+        ``LAST_UPDATED`` is set unless it is in updates already.
+        With :attr:`minimal_patch` unchanged documents are not written but reported as patched.
+
+        :param dict updates_by_id: updates keyed by document id
+        :return: tuple of list of patched ids and dict of errors keyed by document id
+        """
+        return self._bulk_change(
+            updates_by_id,
+            self._prepare_bulk_patch,
+            lambda id, updates: UpdateOne({config.ID_FIELD: id}, {'$set': updates}),
+            self.on_updated)
+
+    def put_many(self, documents_by_id):
+        """Replace many documents using single read and single write round-trip.
+
+        ``LAST_UPDATED`` is set and ``DATE_CREATED`` is kept from original like eve does on PUT.
+
+        :param dict documents_by_id: new documents keyed by document id
+        :return: tuple of list of replaced ids and dict of errors keyed by document id
+        """
+        return self._bulk_change(
+            documents_by_id,
+            self._prepare_bulk_put,
+            lambda id, document: ReplaceOne({config.ID_FIELD: id}, document),
+            self.on_replaced)
+
+    def _prepare_bulk_patch(self, updates, original):
+        updates.setdefault(config.LAST_UPDATED, utcnow())
+        return self._prepare_patch(updates, original)
+
+    def _prepare_bulk_put(self, document, original):
+        document.setdefault(config.LAST_UPDATED, utcnow())
+        if config.DATE_CREATED in original:
+            document.setdefault(config.DATE_CREATED, original[config.DATE_CREATED])
+        return self._prepare_put(document, original)
+
+    def _prepare_patch(self, updates, original):
+        """Run ``on_update`` hook and set new etag.
+
+        :return: ``False`` if there is nothing to write with :attr:`minimal_patch`, ``True`` otherwise
+        """
+        updated = original.copy()
+        self.on_update(updates, original)
+        if self.minimal_patch and not self._drop_unchanged(updates, original):
+            return False
+        updated.update(updates)
+        if config.IF_MATCH:
+            resolve_document_etag(updated, self.datasource)
+            updates[config.ETAG] = updated[config.ETAG]
+        return True
+
+    def _drop_unchanged(self, updates, original):
+        """Remove fields with the same value as in original from updates.
+
+        Values are compared using :func:`eden.utils.is_same`, nested change of type is a change.
+        Changes of ``LAST_UPDATED`` and ``ETAG`` alone don't count as change.
+
+        :return: ``True`` if some field was changed
+        """
+        unchanged = {}
+        for field, value in updates.items():
+            if field in original:
+                old = original[field]
+                if is_same(old, value):
+                    unchanged[field] = value
+        changed = any(field not in unchanged for field in updates
+                      if field not in (config.LAST_UPDATED, config.ETAG))
+        if not changed:
+            unchanged = dict(updates)
+
+        for field in unchanged:
+            del updates[field]
+        counters = minimal_patch_stats[self.datasource]
+        saved = {'fields_saved': len(unchanged), 'writes_saved': 0 if changed else 1}
+        saved['bytes_saved'] = len(bson.BSON.encode(unchanged)) if unchanged else 0
+        for name, count in saved.items():
+            if count:
+                counters[name] += count
+                stats.incr('minimal_patch.{}.{}'.format(self.datasource, name), count)
+        return changed
+
+    def _prepare_put(self, document, original):
+        self.on_replace(document, original)
+        resolve_document_etag(document, self.datasource)
+
+    def _bulk_change(self, changes_by_id, prepare, get_operation, on_changed):
+        """Run bulk patch/put, errors of single document don't abort the batch."""
+        errors = {}
+        unchanged = []
+        # read from the same collection bulk_write uses
+        collection, filter_ = self._get_collection()
+        lookup = {config.ID_FIELD: {'$in': list(changes_by_id)}}
+        if filter_:
+            lookup = {'$and': [filter_, lookup]}
+        originals = {doc[config.ID_FIELD]: doc for doc in collection.find(lookup)}
+
+        ids, operations = [], []
+        for id, changes in changes_by_id.items():
+            original = originals.get(id)
+            if original is None:
+                errors[id] = EdenApiError.notFoundError('Document {} not found'.format(id))
+                continue
+            try:
+                if prepare(changes, original) is False:
+                    unchanged.append(id)
+                    continue
+            except Exception as ex:
+                errors[id] = ex
+                continue
+            ids.append(id)
+            operations.append(get_operation(id, changes))
+
+        if operations:
+            try:
+                self.bulk_write(operations)
+            except BulkWriteError as ex:
+                for write_error in ex.details.get('writeErrors', []):
+                    errors[ids[write_error['index']]] = write_error
+
+        changed = [id for id in ids if id not in errors]
+        for id in changed:
+            try:
+                on_changed(changes_by_id[id], originals[id])
+            except Exception as ex:
+                log.exception('Hook failed after bulk write of {} {}'.format(self.datasource, id))
+                errors[id] = ex
+        return changed + unchanged, errors
+
+    def delete_action(self, lookup=None, batch_size=None):
+        """Delete documents matching lookup, calling ``on_delete``/``on_deleted`` for each.
+
+        Documents are not read at all if service doesn't override the delete hooks.
+        With ``batch_size`` set documents are processed in ``_id`` ordered pages
+        so memory usage doesn't depend on the number of deleted documents.
+
+        :param dict lookup: documents lookup, everything is deleted without hooks if not set
+        :param int batch_size: page size, defaults to :attr:`delete_batch_size`
+        """
         if lookup is None:
-            lookup = {}
-            docs = []
-        else:
-            docs = list(doc for doc in self.get_from_mongo(None, lookup))
+            return self.delete({})
+        if not self._has_delete_hooks():
+            return self.delete(lookup)
+        batch_size = batch_size or self.delete_batch_size
+        if batch_size:
+            return self._delete_in_batches(lookup, batch_size)
+        docs = list(doc for doc in self.get_from_mongo(None, lookup))
         for doc in docs:
             self.on_delete(doc)
         res = self.delete(lookup)
@@ -161,6 +454,34 @@ class BaseService:
             self.on_deleted(doc)
         return res
 
+    def _has_delete_hooks(self):
+        service_class = type(self)
+        return service_class.on_delete is not BaseService.on_delete or \
+            service_class.on_deleted is not BaseService.on_deleted
+
+    def _delete_in_batches(self, lookup, batch_size):
+        req = ParsedRequest()
+        req.sort = '[("%s", 1)]' % config.ID_FIELD
+        req.max_results = batch_size
+        res = None
+        last_id = None
+        while True:
+            page_lookup = lookup
+            if last_id is not None:
+                page_lookup = {'$and': [lookup, {config.ID_FIELD: {'$gt': last_id}}]}
+            docs = list(self.get_from_mongo(req, page_lookup))
+            if not docs:
+                break
+            for doc in docs:
+                self.on_delete(doc)
+            res = self.delete({config.ID_FIELD: {'$in': [doc[config.ID_FIELD] for doc in docs]}})
+            for doc in docs:
+                self.on_deleted(doc)
+            if len(docs) < batch_size:
+                break
+            last_id = docs[-1][config.ID_FIELD]
+        return res
+
     def is_authorized(self, operation, request, **kwargs):
         """Subclass should override if the resource handled by the service has intrinsic privileges.
 
@@ -186,3 +507,17 @@ class BaseService:
 
 class Service(BaseService):
     pass
+
+
+class CachedService(BaseService):
+    """Service keeping read results in process wide LRU cache with TTL.
+
+    Use for read-mostly resources, cache is invalidated on writes.
+    """
+
+    cache_ttl = 60
+    cache_max_entries = 10000
+
+    def __init__(self, datasource=None, backend=None):
+        super().__init__(datasource=datasource, backend=backend)
+        self.cache = TTLCache(datasource, ttl=self.cache_ttl, max_entries=self.cache_max_entries)
@@ -12,8 +12,21 @@
 
 Using statsd client to push metrics via udp to statsd which can send it further.
 """
-from eve_statsd import StatsD
+from flask import current_app as app, has_app_context
+
+
+def incr(name, count=1):
+    """Increment statsd counter, does nothing if statsd is not initialized for current app.
+
+    :param name: counter name
+    :param count: increment
+    """
+    if has_app_context():
+        statsd = app.extensions.get('statsd')
+        if statsd is not None and statsd.client is not None:
+            statsd.client.incr(name, count)
 
 
 def init_app(app):
+    from eve_statsd import StatsD
     StatsD(app)
@@ -1,12 +1,44 @@
 # -*- coding: utf-8; -*-
 import datetime
+import operator
+import re
+from bisect import bisect_right
+from functools import lru_cache
 
 import arrow
 import pytz
 from pytz import utc  # flake8: noqa
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 tzinfo = getattr(datetime, 'tzinfo', object)
 
+#: ISO 8601 formats handled by ``datetime.fromisoformat``, others are parsed by arrow
+ISO_DATE_REGEX = re.compile(r'^\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d{3}(?:\d{3})?)?)?'
+                            r'(?:Z|[+-]\d{2}:\d{2})?)?$')
+
+#: RFC 1123 format used by Eve ``DATE_FORMAT``
+RFC1123_DATE_REGEX = re.compile(r'^(?:Mon|Tue|Wed|Thu|Fri|Sat|Sun), (\d{2}) '
+                                r'(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec) '
+                                r'(\d{4}) (\d{2}):(\d{2}):(\d{2}) GMT$')
+
+DAY = datetime.timedelta(days=1)
+
+DATETIME_OPERATORS = {
+    '$eq': operator.eq,
+    '$ne': operator.ne,
+    '$gt': operator.gt,
+    '$gte': operator.ge,
+    '$lt': operator.lt,
+    '$lte': operator.le,
+}
+
+MONTHS = {name: i for i, name in enumerate(('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+                                            'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), 1)}
+
 
 def utcnow():
     """Get tz aware datetime object.
@@ -21,8 +53,54 @@ def utcnow():
 
 
 def get_date(date_or_string):
-    if date_or_string:
-        return arrow.get(date_or_string).datetime
+    """Get tz aware datetime for given value.
+
+    ISO 8601 and RFC 1123 strings, epoch timestamps and datetime objects are converted
+    without arrow, values without timezone are considered utc.
+
+    :param date_or_string: string, timestamp or datetime
+    :return: datetime or ``None`` if value is empty
+    """
+    if not date_or_string:
+        return None
+    value_type = type(date_or_string)
+    if value_type is str:
+        if ISO_DATE_REGEX.match(date_or_string):
+            if date_or_string[-1] == 'Z':
+                date_or_string = date_or_string[:-1]
+            date = datetime.datetime.fromisoformat(date_or_string)
+            return date if date.tzinfo else date.replace(tzinfo=utc)
+        match = RFC1123_DATE_REGEX.match(date_or_string)
+        if match:
+            day, month, year, hour, minute, second = match.groups()
+            return datetime.datetime(int(year), MONTHS[month], int(day), int(hour), int(minute), int(second),
+                                     tzinfo=utc)
+    elif value_type is datetime.datetime:
+        return date_or_string if date_or_string.tzinfo else date_or_string.replace(tzinfo=utc)
+    elif value_type is int or value_type is float:
+        return datetime.datetime.fromtimestamp(date_or_string, utc)
+    return arrow.get(date_or_string).datetime
+
+
+def get_dates(values):
+    """Get tz aware datetimes for many values, see :func:`get_date`.
+
+    Repeated strings are parsed only once.
+
+    :param values: iterable of strings, timestamps or datetimes
+    :return: list of datetimes
+    """
+    parsed = {}
+    dates = []
+    for value in values:
+        if type(value) is str:
+            date = parsed.get(value)
+            if date is None:
+                date = parsed[value] = get_date(value)
+        else:
+            date = get_date(value)
+        dates.append(date)
+    return dates
 
 
 def get_expiry_date(minutes, offset=None):
@@ -45,7 +123,7 @@ def local_to_utc(local_tz_name, local_datetime):
     :return: the utc datetime
     """
     if local_datetime:
-        local_tz = pytz.timezone(local_tz_name)
+        local_tz = get_timezone(local_tz_name)
         utc_dat = local_tz.localize(local_datetime.replace(tzinfo=None))
         return pytz.utc.normalize(utc_dat)
 
@@ -60,11 +138,149 @@ def utc_to_local(local_tz_name, utc_datetime):
     if utc_datetime and local_tz_name:
         if not utc_datetime.tzinfo:
             utc_datetime = utc_datetime.replace(tzinfo=pytz.utc)
-        local_tz = pytz.timezone(local_tz_name)
+        local_tz = get_timezone(local_tz_name)
         local_dt = utc_datetime.astimezone(local_tz)
         return local_tz.normalize(local_dt)
 
 
+@lru_cache(maxsize=None)
+def get_timezone(tz_name):
+    """Get pytz timezone, instances are created once per name.
+
+    :param tz_name: name of the timezone
+    """
+    return pytz.timezone(tz_name)
+
+
+class TransitionTable:
+    """UTC offsets of timezone with the times when they change.
+
+    Converts many datetimes with ``bisect`` over transition times instead of
+    ``localize``/``normalize`` for every value, giving the same results as pytz.
+
+    :param tz: pytz timezone with ``_utc_transition_times``
+    """
+
+    def __init__(self, tz):
+        self.tz = tz
+        self.times = tz._utc_transition_times
+        self.infos = tz._transition_info
+        self.offsets = [info[0] for info in self.infos]
+
+    def get_info(self, utc_datetime):
+        """Get transition info in effect at naive utc datetime."""
+        return self.infos[max(0, bisect_right(self.times, utc_datetime) - 1)]
+
+    def to_local(self, utc_datetime):
+        info = self.get_info(utc_datetime)
+        return (utc_datetime + info[0]).replace(tzinfo=self.tz._tzinfos[info])
+
+    def to_utc(self, local_datetime):
+        """Get naive utc datetime for naive local datetime, ``None`` if it's ambiguous or missing."""
+        found = None
+        for delta in (-DAY, DAY):
+            offset = self.get_info(local_datetime + delta)[0]
+            utc_datetime = local_datetime - offset
+            if self.get_info(utc_datetime)[0] == offset:
+                if found is not None and found != utc_datetime:
+                    return None
+                found = utc_datetime
+        return found
+
+
+@lru_cache(maxsize=None)
+def get_transition_table(tz_name):
+    """Get :class:`TransitionTable` for timezone, ``None`` for timezones with fixed offset."""
+    tz = get_timezone(tz_name)
+    if not getattr(tz, '_utc_transition_times', None):
+        return None
+    return TransitionTable(tz)
+
+
+def local_to_utc_many(local_tz_name, local_datetimes):
+    """Converts many local datetimes to utc, see :func:`local_to_utc`.
+
+    :param local_tz_name: Name of the local timezone
+    :param local_datetimes: sequence of datetimes or numpy ``datetime64`` array
+    :return: list of utc datetimes, or ``datetime64`` array of utc times
+    """
+    if numpy is not None and isinstance(local_datetimes, numpy.ndarray):
+        return _local_to_utc_array(local_tz_name, local_datetimes)
+    table = get_transition_table(local_tz_name)
+    if table is None:
+        return [local_to_utc(local_tz_name, local_datetime) for local_datetime in local_datetimes]
+    utc_datetimes = []
+    for local_datetime in local_datetimes:
+        if not local_datetime:
+            utc_datetimes.append(None)
+            continue
+        utc_datetime = table.to_utc(local_datetime.replace(tzinfo=None))
+        if utc_datetime is None:
+            utc_datetimes.append(local_to_utc(local_tz_name, local_datetime))
+        else:
+            utc_datetimes.append(utc_datetime.replace(tzinfo=utc))
+    return utc_datetimes
+
+
+def utc_to_local_many(local_tz_name, utc_datetimes):
+    """Converts many utc datetimes to local, see :func:`utc_to_local`.
+
+    :param local_tz_name: Name of the local timezone
+    :param utc_datetimes: sequence of datetimes or numpy ``datetime64`` array
+    :return: list of local datetimes, or ``datetime64`` array of local times
+    """
+    if numpy is not None and isinstance(utc_datetimes, numpy.ndarray):
+        return _utc_to_local_array(local_tz_name, utc_datetimes)
+    table = get_transition_table(local_tz_name) if local_tz_name else None
+    if table is None:
+        return [utc_to_local(local_tz_name, utc_datetime) for utc_datetime in utc_datetimes]
+    local_datetimes = []
+    for utc_datetime in utc_datetimes:
+        if not utc_datetime:
+            local_datetimes.append(None)
+            continue
+        if utc_datetime.tzinfo:
+            utc_datetime = utc_datetime.astimezone(utc).replace(tzinfo=None)
+        local_datetimes.append(table.to_local(utc_datetime))
+    return local_datetimes
+
+
+def _get_array_table(tz_name):
+    table = get_transition_table(tz_name)
+    if table is None:
+        offset = get_timezone(tz_name).utcoffset(datetime.datetime(2000, 1, 1))
+        return None, numpy.array([offset], dtype='timedelta64[us]')
+    return numpy.array(table.times, dtype='datetime64[us]'), numpy.array(table.offsets, dtype='timedelta64[us]')
+
+
+def _get_array_offsets(times, offsets, values):
+    if times is None:
+        return numpy.broadcast_to(offsets[0], values.shape)
+    return offsets[numpy.maximum(numpy.searchsorted(times, values, side='right') - 1, 0)]
+
+
+def _utc_to_local_array(local_tz_name, values):
+    values = values.astype('datetime64[us]')
+    times, offsets = _get_array_table(local_tz_name)
+    return values + _get_array_offsets(times, offsets, values)
+
+
+def _local_to_utc_array(local_tz_name, values):
+    values = values.astype('datetime64[us]')
+    times, offsets = _get_array_table(local_tz_name)
+    day = numpy.timedelta64(1, 'D')
+    before = values - _get_array_offsets(times, offsets, values - day)
+    after = values - _get_array_offsets(times, offsets, values + day)
+    before_valid = _get_array_offsets(times, offsets, before) == values - before
+    after_valid = _get_array_offsets(times, offsets, after) == values - after
+    result = numpy.where(before_valid, before, after)
+    unresolved = ~(before_valid | after_valid) | (before_valid & after_valid & (before != after))
+    for i in numpy.flatnonzero(unresolved):
+        local_datetime = values[i].item()
+        result[i] = numpy.datetime64(local_to_utc(local_tz_name, local_datetime).replace(tzinfo=None), 'us')
+    return result
+
+
 def set_time(current_datetime, timestr):
     """Set time of given datetime according to timestr.
     Time format for timestr is `%H:%M:%S`, eg. 10:14:00.
@@ -102,16 +318,52 @@ def query_datetime(datetime_value, query):
     :param dict query: The query parameters used to check against the datetime_value
     :return boolean: True if all comparison operators pass, else False
     """
-    if '$lte' in query and datetime_value > query['$lte']:
-        return False
-    elif '$lt' in query and datetime_value >= query['$lt']:
-        return False
-    elif '$gte' in query and datetime_value < query['$gte']:
-        return False
-    elif '$gt' in query and datetime_value <= query['$gt']:
-        return False
-    elif '$eq' in query and datetime_value != query['$eq']:
-        return False
-    elif '$ne' in query and datetime_value == query['$ne']:
-        return False
-    return True
+    return compile_datetime_query(query)(datetime_value)
+
+
+def compile_datetime_query(query):
+    """Get function checking datetime against the query, see :func:`query_datetime`.
+
+    Use it when checking many values against the same query.
+    :param dict query: The query parameters
+    :return: function taking datetime and returning True if all comparison operators pass
+    """
+    checks = tuple((DATETIME_OPERATORS[op], value) for op, value in query.items() if op in DATETIME_OPERATORS)
+    if not checks:
+        return lambda datetime_value: True
+    if len(checks) == 1:
+        (compare, bound), = checks
+        return lambda datetime_value: compare(datetime_value, bound)
+    if len(checks) == 2:
+        (compare1, bound1), (compare2, bound2) = checks
+        return lambda datetime_value: compare1(datetime_value, bound1) and compare2(datetime_value, bound2)
+    if len(checks) == 3:
+        (compare1, bound1), (compare2, bound2), (compare3, bound3) = checks
+        return lambda value: compare1(value, bound1) and compare2(value, bound2) and compare3(value, bound3)
+
+    def check(datetime_value):
+        for compare, bound in checks:
+            if not compare(datetime_value, bound):
+                return False
+        return True
+    return check
+
+
+def filter_datetimes(values, query):
+    """Get values matching the query, see :func:`query_datetime`.
+
+    Numpy ``datetime64`` arrays are filtered using array comparisons, tz aware bounds
+    are converted to utc for them.
+    :param values: iterable of datetimes or numpy ``datetime64`` array
+    :param dict query: The query parameters
+    :return: list of matching datetimes, or array if values is an array
+    """
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        mask = numpy.ones(values.shape, dtype=bool)
+        for op, bound in query.items():
+            if op in DATETIME_OPERATORS:
+                if bound.tzinfo:
+                    bound = bound.astimezone(utc).replace(tzinfo=None)
+                mask &= DATETIME_OPERATORS[op](values, numpy.datetime64(bound))
+        return values[mask]
+    return list(filter(compile_datetime_query(query), values))
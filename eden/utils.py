@@ -8,9 +8,18 @@
 # AUTHORS and LICENSE files distributed with this source code, or
 # at https://www.sourcefabric.org/eden/license
 
+import asyncio
 import base64
+import fnmatch
 import hashlib
+import heapq
+import itertools
+import json
+import operator
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from enum import Enum
 from importlib import import_module
@@ -19,6 +28,14 @@ from uuid import uuid4
 import bcrypt
 from bson import ObjectId
 from eve.utils import config
+from flask import current_app as app, has_app_context
+
+# case insensitive collation used by iunique rules and their indexes
+IUNIQUE_COLLATION = {'locale': 'en', 'strength': 2}
+
+HASH_THREAD_POOL_SIZE = 4
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
 
 required_string = {
     'type': 'string',
@@ -86,28 +103,97 @@ def get_hash(input_str, salt):
     return hashed.decode('UTF-8')
 
 
+def check_hash(input_str, hashed):
+    """Check if input_str matches hash created by :func:`get_hash`."""
+    return bcrypt.checkpw(input_str.encode('UTF-8'), hashed.encode('UTF-8'))
+
+
+def _get_hash_pool():
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            size = app.config.get('HASH_THREAD_POOL_SIZE', HASH_THREAD_POOL_SIZE) if has_app_context() \
+                else HASH_THREAD_POOL_SIZE
+            _hash_pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix='eden-hash')
+        return _hash_pool
+
+
+def get_hashes(input_strs, salt):
+    """Hash many strings using hash thread pool, bcrypt releases GIL while hashing.
+
+    Pool size is set by ``HASH_THREAD_POOL_SIZE`` config.
+
+    :param input_strs: iterable of strings
+    :param salt: bcrypt log rounds
+    :return: list of hashes in order of input_strs
+    """
+    return list(_get_hash_pool().map(get_hash, input_strs, itertools.repeat(salt)))
+
+
+def check_hashes(pairs):
+    """Check many ``(input_str, hashed)`` pairs using hash thread pool.
+
+    :return: list of ``True``/``False`` for every pair
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return []
+    input_strs, hashes = zip(*pairs)
+    return list(_get_hash_pool().map(check_hash, input_strs, hashes))
+
+
+async def get_hash_async(input_str, salt):
+    """Hash string in hash thread pool without blocking event loop."""
+    return await asyncio.wrap_future(_get_hash_pool().submit(get_hash, input_str, salt))
+
+
+async def check_hash_async(input_str, hashed):
+    """Check hash in hash thread pool without blocking event loop."""
+    return await asyncio.wrap_future(_get_hash_pool().submit(check_hash, input_str, hashed))
+
+
+def iter_files(path, pattern=None):
+    """
+    Iterate over files in directory without reading all of them first.
+    :param path: directory path
+    :param pattern: glob pattern file names must match, eg. ``*.xml``
+    :return: generator of :class:`os.DirEntry`, their ``stat()`` result is cached
+    """
+    match = re.compile(fnmatch.translate(pattern)).match if pattern else None
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if (match is None or match(entry.name)) and entry.is_file():
+                yield entry
+
+
 def get_sorted_files(path, sort_by=FileSortAttributes.name,
-                     sort_order=SortOrder.asc):
+                     sort_order=SortOrder.asc, limit=None, pattern=None):
     """
     Get the list of files based on the sort order.
     Sort is allowed on name, created and modified datetime
     :param path: directory path
     :param sort_by: "name", "created", "modified"
     :param sort_order: "asc" - ascending, "desc" - descending
+    :param limit: max number of files returned, only first files in sort order are kept in memory
+    :param pattern: glob pattern file names must match, eg. ``*.xml``
     :return: list of files from the path
     """
-    # get the files
-    files = [file for file in os.listdir(path) if os.path.isfile(os.path.join(path, file))]
-    if sort_by == FileSortAttributes.name:
-        files.sort(reverse=(sort_order == SortOrder.desc))
-    elif sort_by == FileSortAttributes.created:
-        files.sort(key=lambda file: os.path.getctime(os.path.join(path, file)), reverse=(sort_order == SortOrder.desc))
+    if sort_by == FileSortAttributes.created:
+        def key(entry):
+            return entry.stat().st_ctime
     elif sort_by == FileSortAttributes.modified:
-        files.sort(key=lambda file: os.path.getmtime(os.path.join(path, file)), reverse=(sort_order == SortOrder.desc))
+        def key(entry):
+            return entry.stat().st_mtime
     else:
-        files.sort(reverse=(sort_order == SortOrder.desc))
+        key = operator.attrgetter('name')
 
-    return files
+    entries = iter_files(path, pattern)
+    if limit is not None:
+        select = heapq.nlargest if sort_order == SortOrder.desc else heapq.nsmallest
+        entries = select(limit, entries, key=key)
+    else:
+        entries = sorted(entries, key=key, reverse=(sort_order == SortOrder.desc))
+    return [entry.name for entry in entries]
 
 
 def is_hashed(input_str):
@@ -147,6 +233,147 @@ class ListCursor(object):
         pass
 
 
+class LazyCursor(object):
+    """Cursor over iterable or generator which reads docs only when they are needed.
+
+    ``skip``, ``limit`` and ``sort`` are applied before reading docs, sort with limit
+    keeps only ``skip + limit`` docs in memory. Docs read so far are cached in pages,
+    so the cursor can be iterated and indexed repeatedly.
+
+    :param docs: iterable of docs
+    :param count: total count estimate, used by :meth:`count` instead of reading all docs
+    :param page_size: number of docs read at once
+    """
+
+    def __init__(self, docs=None, count=None, page_size=100):
+        self.docs = docs if docs is not None else []
+        self.estimate = count
+        self.page_size = page_size
+        self._skip = 0
+        self._limit = 0
+        self._sort = None
+        self._read = 0
+        self._source = None
+        self._results = None
+        self._cache = []
+        self._exhausted = False
+        self._drained = False  # all docs were read from source
+
+    def skip(self, skip):
+        self._check_not_started()
+        self._skip = skip
+        return self
+
+    def limit(self, limit):
+        """Limit number of docs, ``0`` means no limit."""
+        self._check_not_started()
+        self._limit = limit
+        return self
+
+    def sort(self, key_or_list, direction=1):
+        """Sort docs by field or list of ``(field, direction)`` like pymongo cursor."""
+        self._check_not_started()
+        self._sort = [(key_or_list, direction)] if isinstance(key_or_list, str) else list(key_or_list)
+        return self
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            if key.stop is None or key.stop < 0 or (key.start or 0) < 0:
+                self._fetch()
+            else:
+                self._fetch(key.stop)
+        elif key < 0:
+            self._fetch()
+        else:
+            self._fetch(key + 1)
+        return self._cache[key]
+
+    def __iter__(self):
+        i = 0
+        while True:
+            if i == len(self._cache):
+                self._fetch(i + 1)
+                if i == len(self._cache):
+                    return
+            yield self._cache[i]
+            i += 1
+
+    def first(self):
+        """Get first doc."""
+        self._fetch(1)
+        return self._cache[0] if self._cache else None
+
+    def count(self, with_limit_and_skip=False, **kwargs):
+        """Get total count, estimate is used if it was provided and docs were not all read yet.
+
+        :param with_limit_and_skip: count only docs within skip and limit
+        """
+        if with_limit_and_skip and (self.estimate is None or self._exhausted):
+            self._fetch()
+            return len(self._cache)
+
+        if self._drained:
+            total = self._read
+        elif self.estimate is not None:
+            total = self.estimate
+        elif hasattr(self.docs, '__len__'):
+            total = len(self.docs)
+        else:
+            self._fetch()
+            for _ in self._source:
+                pass
+            total = self._read
+
+        if with_limit_and_skip:
+            total = max(0, total - self._skip)
+            return min(total, self._limit) if self._limit else total
+        return total
+
+    def extra(self, response):
+        pass
+
+    def _check_not_started(self):
+        if self._results is not None:
+            raise RuntimeError('Cursor options can not be changed after reading docs')
+
+    def _count_read(self, docs):
+        for doc in docs:
+            self._read += 1
+            yield doc
+        self._drained = True
+
+    def _start(self):
+        self._source = self._count_read(self.docs)
+        docs = self._source
+        end = self._skip + self._limit if self._limit else None
+        if self._sort:
+            if end is not None and len(self._sort) == 1:
+                field, direction = self._sort[0]
+                select = heapq.nsmallest if direction > 0 else heapq.nlargest
+                docs = select(end, docs, key=_get_sort_key(field))
+            else:
+                docs = list(docs)
+                for field, direction in reversed(self._sort):
+                    docs.sort(key=_get_sort_key(field), reverse=direction < 0)
+        self._results = itertools.islice(docs, self._skip, end)
+
+    def _fetch(self, stop=None):
+        """Read pages of docs until there are ``stop`` docs in cache, all docs if stop is not set."""
+        if self._results is None:
+            self._start()
+        while not self._exhausted and (stop is None or len(self._cache) < stop):
+            page = list(itertools.islice(self._results, self.page_size))
+            self._cache.extend(page)
+            self._exhausted = len(page) < self.page_size
+
+
+def _get_sort_key(field):
+    def key(doc):
+        value = doc.get(field)
+        return value is not None, value
+    return key
+
+
 def json_serialize_datetime_objectId(obj):
     """
     serialize so that objectid and date are converted to appropriate format.
@@ -158,7 +385,68 @@ def json_serialize_datetime_objectId(obj):
         return str(obj)
 
 
-def compare_preferences(original, updates):
+class StreamingJSONEncoder(json.JSONEncoder):
+    """JSON encoder for documents with datetime and ObjectId values.
+
+    Formatted dates are cached per second and unknown types raise ``TypeError``.
+    Use :meth:`iter_list` to encode large results in chunks.
+
+    :param date_format: strftime format, ``DATE_FORMAT`` config by default
+    :param chunk_size: number of list items encoded in single chunk
+    """
+
+    max_cached_dates = 10000
+    #: formats using microseconds or timezone can't use cache keyed by naive date without microseconds
+    uncached_directives = ('%f', '%z', '%Z')
+
+    def __init__(self, *args, date_format=None, chunk_size=1000, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.date_format = date_format or config.DATE_FORMAT
+        self.chunk_size = chunk_size
+        cached = not any(directive in self.date_format for directive in self.uncached_directives)
+        self._dates = {} if cached else None
+
+    def default(self, obj):
+        if isinstance(obj, datetime):
+            return self.format_date(obj)
+        if isinstance(obj, ObjectId):
+            return obj.binary.hex()
+        return super().default(obj)
+
+    def format_date(self, date):
+        if self._dates is None:
+            return date.strftime(self.date_format)
+        key = date.replace(microsecond=0, tzinfo=None) if date.microsecond or date.tzinfo else date
+        formatted = self._dates.get(key)
+        if formatted is None:
+            if len(self._dates) >= self.max_cached_dates:
+                self._dates.clear()
+            formatted = self._dates[key] = date.strftime(self.date_format)
+        return formatted
+
+    def iter_list(self, items):
+        """Encode iterable as JSON list, yielding string chunks.
+
+        Items are consumed lazily, so it can encode cursor or generator
+        without loading all documents.
+        """
+        encode = self.encode
+        iterator = iter(items)
+        yield '['
+        separator = ''
+        for chunk in iter(lambda: list(itertools.islice(iterator, self.chunk_size)), []):
+            yield separator + self.item_separator.join(map(encode, chunk))
+            separator = self.item_separator
+        yield ']'
+
+
+def compare_preferences(original, updates, deep=False):
+    """Compare preferences, see :func:`deep_compare` for ``deep`` comparison of nested dicts.
+
+    :return: tuple of added keys, removed keys and dict of modified ``key: (old, new)``
+    """
+    if deep:
+        return deep_compare(original, updates)
     original_keys = set(original.keys())
     updates_keys = set(updates.keys())
     intersect_keys = original_keys.intersection(updates_keys)
@@ -184,3 +472,66 @@ def get_random_token(n=40):
     :param n: how many random bytes to generate
     """
     return base64.b64encode(os.urandom(n)).decode()
+
+
+def deep_compare(original, updates):
+    """Compare nested dicts, keys of nested values are dotted paths like ``a.b.c``.
+
+    Subtrees which are the same object are skipped without walking them,
+    lists and other values are compared as a whole. Values of different types
+    are modified even if equal (``True`` and ``1``, ``1.0`` and ``1``).
+
+    :return: tuple of added paths, removed paths and dict of modified ``path: (old, new)``
+    """
+    added, removed, modified = {}, {}, {}
+    if original is not updates:
+        _deep_compare(original, updates, '', added, removed, modified)
+    return set(added), set(removed), modified
+
+
+def get_mongo_update(original, updates):
+    """Get minimal mongo update changing original document to updates.
+
+    :return: update with ``$set`` and ``$unset`` operators, empty dict if nothing changed
+    """
+    added, removed, modified = {}, {}, {}
+    if original is not updates:
+        _deep_compare(original, updates, '', added, removed, modified)
+    update = {}
+    if added or modified:
+        update['$set'] = dict(added)
+        update['$set'].update((path, new) for path, (old, new) in modified.items())
+    if removed:
+        update['$unset'] = {path: 1 for path in removed}
+    return update
+
+
+def _deep_compare(original, updates, prefix, added, removed, modified):
+    for key, value in updates.items():
+        path = prefix + key
+        if key not in original:
+            added[path] = value
+            continue
+        old = original[key]
+        if old is value:
+            continue
+        if isinstance(old, dict) and isinstance(value, dict):
+            _deep_compare(old, value, path + '.', added, removed, modified)
+        elif not is_same(old, value):
+            modified[path] = (old, value)
+    for key, value in original.items():
+        if key not in updates:
+            removed[prefix + key] = value
+
+
+def is_same(old, value):
+    """Type aware equality of nested values, ``True == 1`` but they are not the same."""
+    if old is value:
+        return True
+    if type(old) is not type(value):
+        return False
+    if isinstance(old, dict):
+        return old.keys() == value.keys() and all(is_same(item, value[key]) for key, item in old.items())
+    if isinstance(old, (list, tuple)):
+        return len(old) == len(value) and all(is_same(a, b) for a, b in zip(old, value))
+    return old == value
@@ -1,16 +1,29 @@
 # -*- coding: utf-8; -*-
+import copy
+import logging
+import pickle
 import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 from bson import ObjectId
 from eve.auth import auth_field_and_value
+from eve.methods.common import serialize
 from eve.io.mongo import Validator
 from eve.utils import config
+from flask import Flask, current_app as app, g, has_app_context, has_request_context, request
 from werkzeug.datastructures import FileStorage
 import phonenumbers
 from phonenumbers import carrier
 from phonenumbers.phonenumberutil import number_type
 
 import eden
+from eden import stats
+from eden.cache import TTLCache
+from eden.utils import IUNIQUE_COLLATION
+
+logger = logging.getLogger(__name__)
 
 ERROR_PATTERN = {'pattern': 1}
 ERROR_UNIQUE = {'unique': 1}
@@ -18,9 +31,315 @@ ERROR_MINLENGTH = {'minlength': 1}
 ERROR_REQUIRED = {'required': 1}
 ERROR_JSON_LIST = {'json_list': 1}
 
+UNIQUE_BATCH_KEY = 'eden_unique_batches'
+VALIDATION_BATCH_KEY = 'eden_validation_batches'
+
+#: rules which query database for every document
+DB_RULES = ('unique', 'iunique', 'iunique_per_parent', 'unique_template',
+            'unique_to_user', 'unique_within_resource', 'data_relation')
+
+#: config used by validators running in validation pool workers
+POOL_CONFIG = ('VALIDATION_ERROR_AS_LIST', 'PHONE_NUMBER_CACHE_SIZE', 'ID_FIELD', 'DATE_FORMAT')
+
+_pool = None
+_pool_size = None
+_pool_lock = threading.Lock()
+
+PHONE_NUMBER_CACHE_SIZE = 10000
+_phone_number_cache = None
+
+EMAIL_MAX_LENGTH = 254
+EMAIL_LOCAL_MAX_LENGTH = 64
+EMAIL_REGEX = re.compile(r"^[a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*@"
+                         r"(?:[a-z0-9](?:[a-z0-9-]*[a-z0-9])?)+(?:\.[a-z0-9](?:[a-z0-9-]{0,4}[a-z0-9])?)*$",
+                         re.IGNORECASE)
+
+
+def is_valid_email(value):
+    """Check if value is valid email address.
+
+    Length and ``@`` position are checked before running the regex.
+    """
+    if not isinstance(value, str) or len(value) > EMAIL_MAX_LENGTH:
+        return False
+    at = value.find('@')
+    if at < 1 or at > EMAIL_LOCAL_MAX_LENGTH or at == len(value) - 1 or value.find('@', at + 1) != -1:
+        return False
+    return EMAIL_REGEX.match(value) is not None
+
+
+def _get_phone_number_cache():
+    global _phone_number_cache
+    size = app.config.get('PHONE_NUMBER_CACHE_SIZE', PHONE_NUMBER_CACHE_SIZE) if has_app_context() \
+        else PHONE_NUMBER_CACHE_SIZE
+    if _phone_number_cache is None:
+        _phone_number_cache = TTLCache('phone_numbers', ttl=None, max_entries=size)
+    _phone_number_cache.max_entries = size
+    return _phone_number_cache
+
+
+def parse_phone_number(value):
+    """Parse and classify phone number, results are cached by the raw string.
+
+    Cache size is set by ``PHONE_NUMBER_CACHE_SIZE`` config, hits and misses
+    are counted in statsd.
+
+    :param value: phone number
+    :return: tuple of ``(is_mobile, e164)``, ``(False, None)`` for invalid numbers
+    """
+    if not isinstance(value, str):
+        return False, None
+    cache = _get_phone_number_cache()
+    result = cache.get(value)
+    if result is not None:
+        stats.incr('phone_number_cache.hit')
+        return result
+    stats.incr('phone_number_cache.miss')
+    try:
+        number = phonenumbers.parse(value)
+        result = (carrier._is_mobile(number_type(number)),
+                  phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164))
+    except phonenumbers.NumberParseException:
+        result = (False, None)
+    cache.set(value, result)
+    return result
+
+
+def validate_emails(emails):
+    """Validate many email addresses.
+
+    :param emails: iterable of email addresses
+    :return: list of ``True``/``False`` for every address
+    """
+    return [is_valid_email(email) for email in emails]
+
+
+class ValidationPlan:
+    """Rules of schema needed for every document, compiled once per schema.
+
+    :param schema: validator schema
+    """
+
+    __slots__ = ('schema', 'required', 'db_rules', 'local_schema', 'db_schema', 'parallel')
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.required = frozenset(field for field, definition in schema.items()
+                                  if definition.get('required') is True)
+        self.db_rules = tuple((field, rule) for field, definition in schema.items()
+                              for rule in DB_RULES if definition.get(rule))
+
+        #: schema without database rules, it can be validated outside of app context
+        self.local_schema = {field: {rule: value for rule, value in definition.items() if rule not in DB_RULES}
+                             for field, definition in schema.items()}
+        self.db_schema = {}
+        for field, rule in self.db_rules:
+            self.db_schema.setdefault(field, {})[rule] = schema[field][rule]
+            if 'type' in schema[field]:
+                self.db_schema[field]['type'] = schema[field]['type']
+
+        #: database rules in nested schemas can't be deferred, callables can't be sent to pool
+        nested_db_rules = any(_has_db_rules(definition.get('schema')) for definition in schema.values())
+        self.parallel = not nested_db_rules and _is_picklable(self.local_schema)
+
+
+def _has_db_rules(value):
+    if isinstance(value, dict):
+        return any(key in DB_RULES or _has_db_rules(item) for key, item in value.items())
+    return False
+
+
+def _is_picklable(value):
+    try:
+        pickle.dumps(value)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+    return True
+
+
+_plans = TTLCache('validation_plans', ttl=None, max_entries=1000)
+
+
+def get_validation_plan(schema, resource=None):
+    """Get compiled :class:`ValidationPlan` for schema of given resource.
+
+    Plans are keyed on the schema dict as defined in domain, not on the cerberus
+    ``DefinitionSchema`` which is created for every validator instance.
+    """
+    key = (resource, id(schema))
+    plan = _plans.get(key)
+    if plan is None or plan.schema is not schema:
+        plan = ValidationPlan(schema)
+        _plans.set(key, plan)
+    return plan
+
+
+def _get_pool(size):
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or _pool_size != size:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=size)
+            _pool_size = size
+        return _pool
+
+
+def _drop_pool(pool):
+    """Drop broken pool, new one is created on next use."""
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is pool:
+            _pool = _pool_size = None
+    pool.shutdown(wait=False)
+
+
+def _validate_chunk(validator_class, schema, resource, allow_unknown, config, documents):
+    worker_app = Flask(__name__)
+    worker_app.config.update(config)
+    results = []
+    with worker_app.app_context():
+        validator = validator_class(schema, resource=resource, allow_unknown=allow_unknown)
+        for document in documents:
+            if validator.validate(document):
+                results.append((validator.document, {}))
+            else:
+                results.append((document, validator.errors))
+    return results
+
+
+def validate_documents(documents, schema, resource=None, pool_size=0, validator_class=None, allow_unknown=False,
+                       config=None):
+    """Validate documents using process pool, database rules must be checked separately.
+
+    Documents are split into chunks validated by ``pool_size`` worker processes,
+    with ``pool_size=0`` they are validated in current process.
+
+    :param documents: list of documents
+    :param schema: schema without database rules, see :attr:`ValidationPlan.local_schema`
+    :param resource: resource name
+    :param pool_size: number of worker processes
+    :param validator_class: validator class, :class:`EdenValidator` by default
+    :param allow_unknown: allow fields which are not in schema
+    :param config: app config used by validators
+    :return: list of ``(document, errors)`` in order of documents, document is normalized if valid
+    """
+    args = (validator_class or EdenValidator, schema, resource, allow_unknown, config or {})
+    if not pool_size:
+        return _validate_chunk(*args, documents)
+    chunk_size = -(-len(documents) // (pool_size * 4))
+    chunks = [documents[i:i + chunk_size] for i in range(0, len(documents), chunk_size)]
+    pool = _get_pool(pool_size)
+    try:
+        futures = [pool.submit(_validate_chunk, *args, chunk) for chunk in chunks]
+        return [result for future in futures for result in future.result()]
+    except BrokenProcessPool:
+        _drop_pool(pool)
+        raise
+
+
+def _normalize_unique(value):
+    """Normalize value for comparison, ``casefold`` matches case insensitive collation (``STRASSE == Straße``)."""
+    return value.strip().casefold()
+
 
 class EdenValidator(Validator):
 
+    _batch_errors = None
+
+    def __init__(self, *args, **kwargs):
+        #: schema as defined in domain, cerberus wraps it in new ``DefinitionSchema`` for every validator
+        self._raw_schema = args[0] if args else kwargs.get('schema')
+        super().__init__(*args, **kwargs)
+
+    def validate(self, document, schema=None, update=False, normalize=True):
+        """Validate document, using results of pool validation for large bulk POST.
+
+        Pool validation is enabled by ``VALIDATION_POOL_SIZE`` config for payloads
+        with at least ``VALIDATION_POOL_THRESHOLD`` documents.
+        """
+        self._batch_errors = None
+        if schema is not None:
+            self._raw_schema = schema
+        if schema is None and not update:
+            result = self._get_batch_result(document)
+            if result is not None:
+                self.document, self._batch_errors = result
+                return not self._batch_errors
+        return super().validate(document, schema=schema, update=update, normalize=normalize)
+
+    @property
+    def errors(self):
+        if self._batch_errors is not None:
+            return self._batch_errors
+        return super().errors
+
+    def _get_batch_result(self, document):
+        if not has_request_context() or request.method != 'POST' or not app.config.get('VALIDATION_POOL_SIZE'):
+            return None
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, list) or len(payload) < app.config.get('VALIDATION_POOL_THRESHOLD', 0):
+            return None
+
+        batches = g.setdefault(VALIDATION_BATCH_KEY, {})
+        batch = batches.get(self.resource)
+        if batch is None:
+            batch = self._get_validation_batch(payload)
+            batches[self.resource] = batch
+
+        entry = batch.get(id(document))
+        if entry is None or entry[0] is not document:
+            return None
+        return entry[1]
+
+    def _get_validation_batch(self, payload):
+        """Validate all documents of bulk POST in validation pool.
+
+        Database rules are checked afterwards in current process, so unique rules
+        can use single query for the whole payload, their errors are added to errors
+        reported by pool for each document.
+
+        :return: dict of ``id(document): (document, (normalized, errors))``
+        """
+        plan = self.plan
+        if not plan.parallel or not all(isinstance(doc, dict) for doc in payload):
+            return {}
+
+        # eve serializes every document just before validating it, pool needs all of them serialized
+        documents = [self._serialize(copy.deepcopy(doc)) for doc in payload]
+        config = {key: app.config[key] for key in POOL_CONFIG if key in app.config}
+        try:
+            results = validate_documents(documents, plan.local_schema, self.resource,
+                                         app.config['VALIDATION_POOL_SIZE'], self.__class__, self.allow_unknown, config)
+        except Exception:
+            # eg. broken pool or custom rule failing in worker without app, eve validates documents one by one
+            logger.warning('Validation pool failed for %s, validating in request', self.resource, exc_info=True)
+            return {}
+
+        if plan.db_schema:
+            db_validator = self.__class__(plan.db_schema, resource=self.resource, allow_unknown=True)
+            for i, (document, errors) in enumerate(results):
+                if not db_validator.validate(document, update=True, normalize=False):
+                    errors = dict(errors)
+                    for field, error in db_validator.errors.items():
+                        errors.setdefault(field, error)
+                    results[i] = (document, errors)
+
+        return {id(doc): (doc, result) for doc, result in zip(payload, results)}
+
+    def _serialize(self, document):
+        """Serialize document like :func:`eve.methods.common.parse` does before validation."""
+        try:
+            return serialize(document, self.resource)
+        except Exception:
+            return document
+
+    @property
+    def plan(self):
+        """Compiled :class:`ValidationPlan` of current schema, shared by all documents."""
+        schema = self._raw_schema if isinstance(self._raw_schema, dict) else self.schema
+        return get_validation_plan(schema, getattr(self, 'resource', None))
+
     def _validate_mapping(self, mapping, field, value):
         """ {'type': 'boolean'} """
         pass
@@ -34,19 +353,18 @@ class EdenValidator(Validator):
         :param field: field name.
         :param value: field value.
         """
-        try:
-            return carrier._is_mobile(number_type(phonenumbers.parse(value)))
-        except:
-            return False
+        return parse_phone_number(value)[0]
+
+    def _normalize_coerce_phone_e164(self, value):
+        """Store phone number in E.164 format, use with ``'coerce': 'phone_e164'``."""
+        return parse_phone_number(value)[1] or value
 
     def _validate_type_email(self, value):
         """Enables validation for `email` schema attribute.
         :param field: field name.
         :param value: field value.
         """
-        regex = "^[a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*@" \
-                "(?:[a-z0-9](?:[a-z0-9-]*[a-z0-9])?)+(?:\.[a-z0-9](?:[a-z0-9-]{0,4}[a-z0-9])?)*$"
-        return re.match(regex, value, re.IGNORECASE)
+        return is_valid_email(value)
 
     def _validate_type_file(self, value):
         """Enables validation for `file` schema attribute."""
@@ -56,8 +374,8 @@ class EdenValidator(Validator):
         """ {'type': 'boolean'} """
         if multiple:
             emails = value.split(',')
-            for email in emails:
-                self._validate_type_email(field, email)
+            if not all(validate_emails(email.strip() for email in emails)):
+                self._error(field, ERROR_PATTERN)
 
     def _set_id_query(self, query):
         if self._id:
@@ -66,16 +384,98 @@ class EdenValidator(Validator):
             except:
                 query[config.ID_FIELD] = {'$ne': self._id}
 
+    def _find_iunique(self, query, projection):
+        """Find documents matching query using case insensitive collation.
+
+        It uses collation index created for ``iunique`` fields by :class:`eden.Resource`.
+        """
+        source, filter_, _, _ = app.data.datasource(self.resource)
+        if filter_:
+            query = {'$and': [filter_, query]}
+        mongo = getattr(app.data, 'mongo', app.data)
+        return mongo.pymongo(self.resource).db[source].find(query, projection=projection, collation=IUNIQUE_COLLATION)
+
+    def _iunique_exists(self, query):
+        """Check if there is document matching query using case insensitive collation."""
+        return next(iter(self._find_iunique(query, {config.ID_FIELD: 1}).limit(1)), None) is not None
+
+    def _check_unique_batch(self, rule, field, value, get_scope):
+        """Check uniqueness of value against all documents of bulk POST at once.
+
+        Existing values are fetched with single ``$in`` query per field on first call,
+        values repeated within the payload are reported for all but the first document.
+
+        :param rule: rule name
+        :param field: field name
+        :param value: field value of validated document
+        :param get_scope: function returning dict of fields which must match for document
+        :return: ``True``/``False`` if value is unique or not, ``None`` if batch check doesn't apply
+        """
+        if self._id or '.' in field or not has_request_context() or request.method != 'POST':
+            return None
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, list) or len(payload) < 2:
+            return None
+
+        batches = g.setdefault(UNIQUE_BATCH_KEY, {})
+        batch = batches.get((self.resource, rule, field))
+        if batch is None:
+            batch = self._get_unique_batch(payload, field, get_scope)
+            batches[(self.resource, rule, field)] = batch
+
+        try:
+            key = (tuple(sorted(get_scope(self.document).items())), _normalize_unique(value))
+            if key not in batch['candidates']:
+                return None
+        except TypeError:
+            return None
+        if key in batch['existing'] or key in batch['seen']:
+            return False
+        batch['seen'].add(key)
+        return True
+
+    def _get_unique_batch(self, payload, field, get_scope):
+        scopes = {}
+        candidates = set()
+        for doc in payload:
+            if not isinstance(doc, dict):
+                continue
+            # scopes must match validated document, which is serialized by eve (eg. objectid parent)
+            doc = self._serialize(copy.deepcopy(doc))
+            value = doc.get(field)
+            if not isinstance(value, str):
+                continue
+            scope = get_scope(doc)
+            try:
+                scope_key = tuple(sorted(scope.items()))
+                candidates.add((scope_key, _normalize_unique(value)))
+            except TypeError:
+                continue
+            scopes.setdefault(scope_key, (scope, set()))[1].add(value.strip())
+
+        existing = set()
+        if scopes:
+            queries = [dict(scope, **{field: {'$in': list(values)}}) for scope, values in scopes.values()]
+            query = queries[0] if len(queries) == 1 else {'$or': queries}
+            projection = {key: 1 for scope_key in scopes for key, _ in scope_key}
+            projection[field] = 1
+            for doc in self._find_iunique(query, projection):
+                for scope_key in scopes:
+                    if all(doc.get(key) == value for key, value in scope_key):
+                        existing.add((scope_key, _normalize_unique(doc[field])))
+        return {'candidates': candidates, 'existing': existing, 'seen': set()}
+
     def _validate_iunique(self, unique, field, value):
         """ {'type': 'boolean'} """
 
         if unique:
-            pattern = '^{}$'.format(re.escape(value.strip()))
-            query = {field: re.compile(pattern, re.IGNORECASE)}
-            self._set_id_query(query)
+            is_unique = self._check_unique_batch('iunique', field, value, lambda doc: {})
+            if is_unique is None:
+                query = {field: value.strip()}
+                self._set_id_query(query)
+                is_unique = not self._iunique_exists(query)
 
-            cursor = eden.get_resource_service(self.resource).get_from_mongo(req=None, lookup=query)
-            if cursor.count():
+            if not is_unique:
                 self._error(field, ERROR_UNIQUE)
 
     def _validate_iunique_per_parent(self, parent_field, field, value):
@@ -86,24 +486,28 @@ class EdenValidator(Validator):
         parent_field_value = update.get(parent_field, original.get(parent_field))
 
         if parent_field:
-            pattern = '^{}$'.format(re.escape(value.strip()))
-            query = {
-                field: re.compile(pattern, re.IGNORECASE),
-                parent_field: parent_field_value
-            }
-            self._set_id_query(query)
-
-            cursor = eden.get_resource_service(self.resource).get_from_mongo(req=None, lookup=query)
-            if cursor.count():
+            is_unique = self._check_unique_batch('iunique_per_parent', field, value,
+                                                 lambda doc: {parent_field: doc.get(parent_field)})
+            if is_unique is None:
+                query = {
+                    field: value.strip(),
+                    parent_field: parent_field_value
+                }
+                self._set_id_query(query)
+                is_unique = not self._iunique_exists(query)
+
+            if not is_unique:
                 self._error(field, ERROR_UNIQUE)
 
     def _validate_required_fields(self, document):
         """ {'type': 'boolean'} """
-        required = list(field for field, definition in self.schema.items()
-                        if definition.get('required') is True)
-        missing = set(required) - set(key for key in document.keys()
-                                      if document.get(key) is not None or
-                                      not self.ignore_none_values)
+        required = self.plan.required
+        if not required:
+            return
+        if self.ignore_none_values:
+            missing = required.difference(key for key, value in document.items() if value is not None)
+        else:
+            missing = required.difference(document)
         for field in missing:
             self._error(field, ERROR_REQUIRED)
 
@@ -120,6 +524,18 @@ class EdenValidator(Validator):
         is_public = update.get('is_public', original.get('is_public', None))
         template_name = update.get('template_name', original.get('template_name', None))
 
+        def get_scope(doc):
+            if doc.get('is_public'):
+                return {'is_public': True}
+            _, auth_value = auth_field_and_value(self.resource)
+            return {'user': auth_value, 'is_public': False}
+
+        is_unique = self._check_unique_batch('unique_template', 'template_name', template_name, get_scope)
+        if is_unique is False:
+            self._error(field, "Template Name is not unique")
+        if is_unique is not None:
+            return
+
         if is_public:
             query = {'is_public': True}
         else:
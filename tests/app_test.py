@@ -0,0 +1,37 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/eden/license
+
+import unittest
+
+from eden.factory.app import format_startup_profile, get_app
+
+
+def init_app(app):
+    """This module is used as installed app in tests."""
+    app.config['TEST_INITIALIZED'] = app.config.get('TEST_INITIALIZED', 0) + 1
+
+
+class GetAppTestCase(unittest.TestCase):
+
+    def test_startup_profile(self):
+        with self.assertLogs(level='WARNING') as logs:
+            app = get_app({'INSTALLED_APPS': ['tests.app_test'], 'STARTUP_PROFILE': True})
+        self.assertIn('tests.app_test', logs.output[-1])
+        self.assertEqual(1, app.config['TEST_INITIALIZED'])
+        self.assertEqual(['tests.app_test'], [row[0] for row in app.startup_profile])
+        self.assertIn('tests.app_test', format_startup_profile(app.startup_profile))
+
+    def test_lazy_installed_apps(self):
+        app = get_app({'INSTALLED_APPS': [], 'LAZY_INSTALLED_APPS': ['tests.app_test']})
+        self.assertNotIn('TEST_INITIALIZED', app.config)
+        client = app.test_client()
+        client.get('/')
+        client.get('/')
+        self.assertEqual(1, app.config['TEST_INITIALIZED'])
@@ -0,0 +1,47 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/eden/license
+
+import unittest
+from unittest import mock
+
+from eden.cache import TTLCache
+
+
+class TTLCacheTestCase(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = TTLCache('lru', max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(1, cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(2, len(cache))
+        self.assertEqual(1, cache.stats()['evictions'])
+
+    def test_ttl_expiration(self):
+        cache = TTLCache('ttl', ttl=10)
+        with mock.patch('eden.cache.time.monotonic', return_value=0):
+            cache.set('a', 1)
+        with mock.patch('eden.cache.time.monotonic', return_value=5):
+            self.assertEqual(1, cache.get('a'))
+        with mock.patch('eden.cache.time.monotonic', return_value=11):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(0, len(cache))
+        self.assertEqual({'hits': 1, 'misses': 1}, {k: cache.stats()[k] for k in ('hits', 'misses')})
+
+    def test_evict(self):
+        cache = TTLCache('evict')
+        cache.set('a', {'_id': 1})
+        cache.set('b', {'_id': 2})
+        self.assertEqual(1, cache.evict(lambda key, value: value['_id'] == 1))
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('b'))
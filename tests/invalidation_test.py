@@ -0,0 +1,131 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/eden/license
+
+import os
+import queue
+import unittest
+from unittest import mock
+
+from bson import ObjectId
+from flask import Flask
+
+from eden import cache, signals
+from eden.cache import TTLCache, send_invalidation
+from eden.invalidation import QueueBus, RedisBus
+
+
+class FakePubSub(object):
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.messages = []
+
+    def subscribe(self, channel):
+        self.broker.subscribers.append(self)
+
+    def get_message(self, timeout=0):
+        return self.messages.pop(0) if self.messages else None
+
+
+class FakeRedis(object):
+    """Stand-in for redis client."""
+
+    def __init__(self):
+        self.subscribers = []
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self)
+
+    def publish(self, channel, message):
+        for subscriber in self.subscribers:
+            subscriber.messages.append({'type': 'message', 'data': message.encode('utf-8')})
+
+
+def get_app():
+    app = Flask(__name__)
+    app.config['ID_FIELD'] = '_id'
+    return app
+
+
+class InvalidationBusTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = TTLCache('bus_items')
+        self.cache.set(('find_one', 'a'), {'_id': ObjectId('528de7b03b80a13eefc5e610')})
+        self.cache.set(('find_one', 'b'), {'_id': ObjectId('528de7b03b80a13eefc5e611')})
+
+    def get_queue_buses(self):
+        first, second = queue.Queue(), queue.Queue()
+        buses = QueueBus(first, [second]), QueueBus(second, [first])
+        for bus in buses:
+            bus.app = get_app()
+        return buses
+
+    def test_queue_bus(self):
+        local, remote = self.get_queue_buses()
+        local.publish(None, resource='bus_items', id=ObjectId('528de7b03b80a13eefc5e610'))
+        self.assertEqual(0, local.poll())
+        self.assertEqual(1, remote.poll())
+        self.assertIsNone(self.cache.get(('find_one', 'a')))
+        self.assertIsNotNone(self.cache.get(('find_one', 'b')))
+
+    def test_local_invalidation_is_published(self):
+        local, remote = self.get_queue_buses()
+        signals.connect('cache:invalidate', local.publish)
+        try:
+            send_invalidation(self.cache)
+        finally:
+            signals.blinker.signal('cache:invalidate').disconnect(local.publish)
+        self.assertEqual(1, remote.poll())
+        self.assertEqual(0, len(self.cache))
+
+    def test_redis_bus(self):
+        client = FakeRedis()
+        local, remote = RedisBus(client), RedisBus(client)
+        local.app = remote.app = get_app()
+        local.publish(None, resource='bus_items', id=None)
+        self.assertEqual(0, local.poll())
+        self.assertEqual(1, remote.poll())
+        self.assertEqual(0, len(self.cache))
+
+    def test_start_once_per_process(self):
+        local, remote = self.get_queue_buses()
+        self.addCleanup(local.stop)
+        local.start()
+        thread = local._thread
+        local.start()
+        self.assertIs(thread, local._thread)
+        send_invalidation(self.cache)
+        self.assertEqual(1, remote.inbox.qsize())
+
+        with mock.patch('eden.invalidation.os.getpid', return_value=os.getpid() + 1):
+            local.start()
+            self.assertIsNot(thread, local._thread)
+
+    def test_redis_bus_subscribes_in_forked_process(self):
+        client = FakeRedis()
+        local, remote = RedisBus(client), RedisBus(client)
+        local.app = remote.app = get_app()
+        pubsub = remote.pubsub
+        with mock.patch('eden.invalidation.os.getpid', return_value=os.getpid() + 1):
+            self.assertIsNone(remote.receive(0))
+            self.assertIsNot(pubsub, remote.pubsub)
+            local.publish(None, resource='bus_items', id=None)
+            self.assertEqual(1, remote.poll())
+
+    def test_bus_starts_on_first_request(self):
+        local, remote = self.get_queue_buses()
+        self.addCleanup(local.stop)
+        app = get_app()
+        app.config['CACHE_INVALIDATION_BUS'] = local
+        cache.init_app(app)
+        self.assertIsNone(local._thread)
+        app.test_client().get('/')
+        self.assertTrue(local._thread.is_alive())
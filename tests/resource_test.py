@@ -0,0 +1,185 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/eden/license
+
+import unittest
+
+from events import Events
+
+from eden.resource import Resource
+from eden.services import BaseService
+
+
+class FakeApp(Events):
+
+    def __init__(self):
+        super().__init__()
+        self.registered = {}
+
+    def register_resource(self, name, settings):
+        settings.setdefault('schema', {})
+        settings['item_title'] = name
+        self.registered[name] = settings
+
+
+class ItemsResource(Resource):
+    schema = {'name': {'type': 'string'}}
+    datasource = {'source': 'items'}
+    item_methods = ['GET']
+    etag_ignore_fields = []
+    mongo_indexes = {'name_1': ([('name', 1)], {'unique': True})}
+
+
+class ResourceSchemaTestCase(unittest.TestCase):
+
+    def register(self, resource_class, name='items'):
+        app = FakeApp()
+        resource_class(name, app=app, service=BaseService(name))
+        return app.registered[name]
+
+    def test_endpoint_schema(self):
+        self.assertEqual({
+            'schema': ItemsResource.schema,
+            'datasource': {'source': 'items'},
+            'item_methods': ['GET'],
+            'mongo_indexes__init': ItemsResource.mongo_indexes,
+            'item_title': 'items',
+        }, self.register(ItemsResource))
+
+    def test_endpoint_schema_is_compiled_once(self):
+        first = self.register(ItemsResource)
+        compiled = ItemsResource.__dict__['_compiled_endpoint_schema']
+        second = self.register(ItemsResource)
+        self.assertIs(compiled, ItemsResource.__dict__['_compiled_endpoint_schema'])
+        self.assertIsNot(first, second)
+        self.assertNotIn('item_title', compiled)
+
+    def test_subclass_gets_own_schema(self):
+        class PublicItemsResource(ItemsResource):
+            public_methods = ['GET']
+
+        self.register(ItemsResource)
+        self.assertEqual(['GET'], self.register(PublicItemsResource)['public_methods'])
+        self.assertNotIn('public_methods', self.register(ItemsResource))
+
+
+class AuthorizingService(BaseService):
+
+    def is_authorized(self, operation, request, **kwargs):
+        return True
+
+    def on_update(self, updates, original):
+        pass
+
+
+class HookedResource(Resource):
+    insert_readonly = ['owner']
+
+    @staticmethod
+    def pre_GET(request, lookup):
+        pass
+
+
+class CachedResource(Resource):
+    cache = {'ttl': 60}
+
+
+class ResourceHooksTestCase(unittest.TestCase):
+
+    def test_no_hooks_for_plain_resource(self):
+        app = FakeApp()
+        Resource('plain', app=app, service=BaseService('plain'))
+        self.assertEqual([], [slot for slot in app if len(slot)])
+
+    def test_overridden_hooks_are_registered(self):
+        app = FakeApp()
+        resource = HookedResource('hooked', app=app, service=BaseService('hooked'))
+        self.assertEqual([resource.pre_GET], list(app.on_pre_GET_hooked))
+        self.assertEqual([resource.on_pre_insert], list(app.on_insert_hooked))
+        self.assertEqual(0, len(app.on_update_hooked))
+
+    def test_authorizing_service_hooks(self):
+        app = FakeApp()
+        service = AuthorizingService('authorized')
+        resource = Resource('authorized', app=app, service=service)
+        self.assertEqual([service.on_update, resource.on_pre_update], list(app.on_update_authorized))
+        self.assertEqual([resource.on_pre_fetched_item], list(app.on_fetched_item_authorized))
+        self.assertEqual(0, len(app.on_updated_authorized))
+
+    def test_registration_is_idempotent(self):
+        app = FakeApp()
+        service = AuthorizingService('authorized')
+        Resource('authorized', app=app, service=service)
+        Resource('authorized', app=app, service=service)
+        self.assertEqual(1, list(app.on_update_authorized).count(service.on_update))
+
+    def test_insert_invalidates_cached_queries(self):
+        app = FakeApp()
+        service = BaseService('cached')
+        resource = CachedResource('cached', app=app, service=service)
+        self.assertEqual([resource.on_cache_inserted], list(app.on_inserted_cached))
+        service.cache.set(('get', '[]'), [{'_id': 1}])
+        service.cache.set(('find_one', "[('_id', 1)]"), {'_id': 1})
+        app.on_inserted_cached([{'_id': 2}])
+        self.assertIsNone(service.cache.get(('get', '[]')))
+        self.assertEqual({'_id': 1}, service.cache.get(('find_one', "[('_id', 1)]")))
+
+
+class ReadonlyResource(Resource):
+    insert_readonly = ['owner', 'meta.created_by']
+    update_readonly = ['owner']
+
+
+class ResourceReadonlyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.resource = ReadonlyResource('readonly', app=FakeApp(), service=BaseService('readonly'))
+
+    def test_readonly_fields_are_compiled(self):
+        self.assertEqual((frozenset(['owner']), (('meta', 'created_by'), )),
+                         ReadonlyResource._readonly['insert_readonly'][1])
+
+    def test_on_pre_insert(self):
+        docs = [
+            {'name': 'foo', 'owner': 1, 'meta': {'created_by': 1, 'source': 'api'}},
+            {'name': 'bar', 'meta': [{'created_by': 1}, {'created_by': 2, 'lang': 'en'}]},
+        ]
+        self.resource.on_pre_insert(docs)
+        self.assertEqual([
+            {'name': 'foo', 'meta': {'source': 'api'}},
+            {'name': 'bar', 'meta': [{}, {'lang': 'en'}]},
+        ], docs)
+
+    def test_on_pre_update(self):
+        updates = {'name': 'foo', 'owner': 1}
+        self.resource.on_pre_update(updates, {})
+        self.assertEqual({'name': 'foo'}, updates)
+
+    def test_readonly_set_on_instance(self):
+        self.resource.update_readonly = ['name']
+        updates = {'name': 'foo', 'owner': 1}
+        self.resource.on_pre_update(updates, {})
+        self.assertEqual({'owner': 1}, updates)
+
+
+class UsersResource(Resource):
+    schema = {
+        'username': {'type': 'string', 'iunique': True},
+        'role': {'type': 'string', 'iunique_per_parent': 'group'},
+    }
+    mongo_indexes = {'role_iunique_per_parent': ([('role', 1)], {})}
+
+
+class ResourceIUniqueIndexesTestCase(unittest.TestCase):
+
+    def test_iunique_indexes(self):
+        indexes = UsersResource.get_endpoint_schema()['mongo_indexes__init']
+        self.assertEqual(([('username', 1)], {'collation': {'locale': 'en', 'strength': 2}}),
+                         indexes['username_iunique'])
+        self.assertEqual(([('role', 1)], {}), indexes['role_iunique_per_parent'])
@@ -0,0 +1,381 @@
+# -*- coding: utf-8; -*-
+#
+# This file is part of Superdesk.
+#
+# Copyright 2013, 2014 Sourcefabric z.u. and contributors.
+#
+# For the full copyright and license information, please see the
+# AUTHORS and LICENSE files distributed with this source code, or
+# at https://www.sourcefabric.org/eden/license
+
+from datetime import datetime
+import types
+import unittest
+from unittest import mock
+
+from eve.io.mongo import MongoJSONEncoder
+from flask import Flask
+from pymongo.errors import BulkWriteError
+
+from eden import services
+from eden.services import BaseService, CachedService
+
+
+class FakeCursor(object):
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.batch = None
+
+    def __iter__(self):
+        return iter(self.docs)
+
+    def batch_size(self, batch):
+        self.batch = batch
+        return self
+
+
+class FakeCollection(object):
+    """Stand-in for pymongo collection."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = []
+        self.operations = None
+        self.ordered = None
+        self.write_errors = []
+
+    def find(self, query):
+        self.queries.append(query)
+        lookup = query['$and'][1] if '$and' in query else query
+        return FakeCursor([doc for doc in self.docs if doc['_id'] in lookup['_id']['$in']])
+
+    def bulk_write(self, operations, ordered=True):
+        self.operations = operations
+        self.ordered = ordered
+        if self.write_errors:
+            raise BulkWriteError({'writeErrors': self.write_errors})
+
+
+class FakeBackend(object):
+    """Stand-in for eve mongo data layer."""
+
+    def __init__(self, docs=None):
+        self.docs = docs or []
+        self.cursor = None
+        self.options = None
+        self.filter = None
+        self.collection = FakeCollection(self.docs)
+
+    def find(self, datasource, req, where, **kwargs):
+        self.cursor = FakeCursor(self.docs)
+        return self.cursor, len(self.docs)
+
+    def aggregate(self, datasource, pipeline, options):
+        self.options = options
+        return FakeCursor(self.docs)
+
+    def datasource(self, resource):
+        return resource + '_source', self.filter, None, None
+
+    def pymongo(self, resource=None):
+        return types.SimpleNamespace(db={resource + '_source': self.collection})
+
+    def find_one(self, datasource, req, **lookup):
+        return next((doc for doc in self.docs if doc['_id'] == lookup['_id']), None)
+
+    def update(self, datasource, id, updates, original):
+        self.updates = updates
+        return updates
+
+
+def get_test_app():
+    app = Flask(__name__)
+    app.config.update({
+        'ID_FIELD': '_id',
+        'ETAG': '_etag',
+        'LAST_UPDATED': '_updated',
+        'DATE_CREATED': '_created',
+        'IF_MATCH': True,
+        'DOMAIN': {'items': {'etag_ignore_fields': []}},
+    })
+    app.data = types.SimpleNamespace(json_encoder_class=MongoJSONEncoder)
+    return app
+
+
+class BaseServiceStreamingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = FakeBackend([{'_id': i} for i in range(5)])
+        self.service = BaseService('items', backend=self.backend)
+
+    def test_find_iter_is_lazy(self):
+        docs = self.service.find_iter(None, {}, batch_size=2)
+        self.assertIsInstance(docs, types.GeneratorType)
+        self.assertEqual({'_id': 0}, next(docs))
+        self.assertEqual(2, self.backend.cursor.batch)
+
+    def test_find_returns_list(self):
+        self.assertEqual(self.backend.docs, self.service.find(None, {}))
+
+    def test_aggregate_iter_batch_size(self):
+        docs = list(self.service.aggregate_iter([], {'allowDiskUse': True}, batch_size=100))
+        self.assertEqual(5, len(docs))
+        self.assertEqual({'allowDiskUse': True, 'batchSize': 100}, self.backend.options)
+
+    def test_aggregate_returns_list(self):
+        self.assertEqual(self.backend.docs, self.service.aggregate([], {}))
+
+
+class PatchingService(BaseService):
+
+    def on_update(self, updates, original):
+        if updates.get('fail'):
+            raise ValueError('hook failed')
+
+    def on_updated(self, updates, original):
+        self.patched.append(original['_id'])
+
+
+class BaseServiceBulkTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = FakeBackend([{'_id': i, 'name': 'doc %d' % i} for i in range(3)])
+        self.service = PatchingService('items', backend=self.backend)
+        self.service.patched = []
+        self.collection = self.backend.collection
+        self.ctx = get_test_app().app_context()
+        self.ctx.push()
+
+    def tearDown(self):
+        self.ctx.pop()
+
+    def test_patch_many(self):
+        ids, errors = self.service.patch_many({0: {'name': 'foo'}, 1: {'fail': True}, 5: {'name': 'bar'}})
+        self.assertEqual([0], ids)
+        self.assertEqual([0], self.service.patched)
+        self.assertIsInstance(errors[1], ValueError)
+        self.assertEqual(404, errors[5].status_code)
+        self.assertEqual(1, len(self.collection.operations))
+        self.assertFalse(self.collection.ordered)
+        self.assertIn('_etag', self.collection.operations[0]._doc['$set'])
+        self.assertIsInstance(self.collection.operations[0]._doc['$set']['_updated'], datetime)
+
+    def test_bulk_reads_from_datasource(self):
+        self.backend.filter = {'deleted': False}
+        ids, errors = self.service.put_many({0: {'name': 'foo'}})
+        self.assertEqual([0], ids)
+        self.assertEqual({'$and': [{'deleted': False}, {'_id': {'$in': [0]}}]}, self.collection.queries[0])
+
+    def test_patch_many_write_errors(self):
+        self.collection.write_errors = [{'index': 1, 'errmsg': 'duplicate key'}]
+        ids, errors = self.service.patch_many({0: {'name': 'foo'}, 1: {'name': 'bar'}, 2: {'name': 'baz'}})
+        self.assertEqual([0, 2], ids)
+        self.assertEqual('duplicate key', errors[1]['errmsg'])
+
+    def test_minimal_patch(self):
+        self.service.minimal_patch = True
+        services.minimal_patch_stats.clear()
+        self.backend.docs[0].update({'tags': ['a', 'b'], 'count': 1, '_updated': 'yesterday'})
+        self.backend.updates = None
+
+        self.assertIsNone(self.service.patch(0, {'name': 'doc 0', 'tags': ['a', 'b'], '_updated': 'today'}))
+        self.assertIsNone(self.backend.updates)
+        self.assertEqual([], self.service.patched)
+
+        updates = {'name': 'doc 0', 'tags': ['a', 'b'], 'count': True, '_updated': 'today'}
+        self.service.patch(0, updates)
+        self.assertEqual(['count', '_updated', '_etag'], list(self.backend.updates))
+        self.assertEqual([0], self.service.patched)
+
+        self.assertEqual({'fields_saved': 5, 'writes_saved': 1, 'bytes_saved': mock.ANY},
+                         services.minimal_patch_stats['items'])
+        self.assertGreater(services.minimal_patch_stats['items']['bytes_saved'], 40)
+
+    def test_minimal_patch_nested_type_change(self):
+        self.service.minimal_patch = True
+        self.backend.docs[0]['prefs'] = {'x': 1}
+        self.backend.updates = None
+        self.service.patch(0, {'prefs': {'x': True}})
+        self.assertEqual({'x': True}, self.backend.updates['prefs'])
+
+    def test_minimal_patch_many(self):
+        self.service.minimal_patch = True
+        ids, errors = self.service.patch_many({0: {'name': 'doc 0'}, 1: {'name': 'foo'}})
+        self.assertEqual([1, 0], ids)
+        self.assertEqual([1], self.service.patched)
+        self.assertEqual(1, len(self.collection.operations))
+
+    def test_put_many(self):
+        self.backend.docs[2]['_created'] = 'yesterday'
+        ids, errors = self.service.put_many({0: {'name': 'foo'}, 2: {'name': 'bar'}})
+        self.assertEqual([0, 2], ids)
+        self.assertEqual({}, errors)
+        self.assertIn('_etag', self.collection.operations[1]._doc)
+        self.assertIsInstance(self.collection.operations[1]._doc['_updated'], datetime)
+        self.assertEqual('yesterday', self.collection.operations[1]._doc['_created'])
+        self.assertNotIn('_created', self.collection.operations[0]._doc)
+
+
+class PagingBackend(object):
+
+    def __init__(self, size):
+        self.docs = [{'_id': i} for i in range(size)]
+        self.reads = []
+        self.deletes = []
+
+    def get_from_mongo(self, datasource, req, lookup):
+        self.reads.append(lookup)
+        last_id = lookup['$and'][1]['_id']['$gt'] if '$and' in lookup else -1
+        return [doc for doc in self.docs if doc['_id'] > last_id][:req.max_results]
+
+    def delete(self, datasource, lookup):
+        self.deletes.append(lookup)
+        ids = lookup.get('_id', {}).get('$in')
+        self.docs = [doc for doc in self.docs if ids is not None and doc['_id'] not in ids]
+
+
+class DeletingService(BaseService):
+
+    def on_deleted(self, doc):
+        self.deleted.append(doc['_id'])
+
+
+class BaseServiceDeleteTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.ctx = get_test_app().app_context()
+        self.ctx.push()
+
+    def tearDown(self):
+        self.ctx.pop()
+
+    def test_delete_without_hooks_skips_read(self):
+        backend = PagingBackend(5)
+        BaseService('items', backend=backend).delete_action({'expired': True}, batch_size=2)
+        self.assertEqual([], backend.reads)
+        self.assertEqual([{'expired': True}], backend.deletes)
+
+    def test_delete_in_batches(self):
+        backend = PagingBackend(5)
+        service = DeletingService('items', backend=backend)
+        service.deleted = []
+        service.delete_action({'expired': True}, batch_size=2)
+        self.assertEqual([0, 1, 2, 3, 4], service.deleted)
+        self.assertEqual(3, len(backend.deletes))
+        self.assertEqual({'_id': {'$in': [4]}}, backend.deletes[-1])
+        self.assertEqual([], backend.docs)
+
+
+class CountingBackend(object):
+
+    def __init__(self):
+        self.reads = 0
+        self.docs = [{'_id': 1}]
+        self.on_write = None
+
+    def find_one(self, datasource, req, **lookup):
+        self.reads += 1
+        return {'_id': lookup.get('_id'), 'reads': self.reads}
+
+    def get(self, datasource, req, lookup):
+        self.reads += 1
+        return list(self.docs)
+
+    def insert(self, datasource, docs, **kwargs):
+        self.docs.extend(docs)
+        return [doc['_id'] for doc in docs]
+
+    def update(self, datasource, id, updates, original):
+        if self.on_write:
+            self.on_write()
+
+
+class CachedRequestService(BaseService):
+    request_cache = True
+
+
+class BaseServiceRequestCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = CountingBackend()
+        self.service = CachedRequestService('items', backend=self.backend)
+        self.app = get_test_app()
+
+    def test_find_one_is_cached_per_request(self):
+        with self.app.test_request_context():
+            self.assertEqual(self.service.find_one(req=None, _id=1), self.service.find_one(req=None, _id=1))
+            self.service.find_one(req=None, _id=2)
+            self.assertEqual(2, self.backend.reads)
+            self.assertEqual({'hits': 1, 'misses': 2}, BaseService.request_cache_stats())
+        with self.app.test_request_context():
+            self.service.find_one(req=None, _id=1)
+            self.assertEqual(3, self.backend.reads)
+
+    def test_cached_documents_are_copies(self):
+        with self.app.test_request_context():
+            doc = self.service.find_one(req=None, _id=1)
+            doc['reads'] = 'modified'
+            cached = self.service.find_one(req=None, _id=1)
+            self.assertEqual(1, cached['reads'])
+            cached['reads'] = 'modified'
+            self.assertEqual(1, self.service.find_one(req=None, _id=1)['reads'])
+            self.assertEqual(1, self.backend.reads)
+
+    def test_update_invalidates_cache(self):
+        with self.app.test_request_context():
+            self.service.find_one(req=None, _id=1)
+            self.service.find_one(req=None, _id=2)
+            self.service.update(1, {}, {})
+            self.assertEqual(3, self.service.find_one(req=None, _id=1)['reads'])
+            self.assertEqual(2, self.service.find_one(req=None, _id=2)['reads'])
+
+    def test_cache_is_opt_in(self):
+        service = BaseService('items', backend=self.backend)
+        with self.app.test_request_context():
+            service.find_one(req=None, _id=1)
+            service.find_one(req=None, _id=1)
+        self.assertEqual(2, self.backend.reads)
+
+
+class CachedServiceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = CountingBackend()
+        self.service = CachedService('cached_items', backend=self.backend)
+        self.ctx = get_test_app().app_context()
+        self.ctx.push()
+
+    def tearDown(self):
+        self.ctx.pop()
+
+    def test_find_one_is_cached(self):
+        doc = self.service.find_one(req=None, _id=1)
+        doc['reads'] = 'changed'
+        self.assertEqual(1, self.service.find_one(req=None, _id=1)['reads'])
+        self.assertEqual(1, self.backend.reads)
+        self.assertEqual(1, self.service.cache.stats()['hits'])
+
+    def test_update_invalidates_cache(self):
+        self.service.find_one(req=None, _id=1)
+        self.service.find_one(req=None, _id=2)
+        self.service.update(1, {}, {})
+        self.assertEqual(3, self.service.find_one(req=None, _id=1)['reads'])
+        self.assertEqual(2, self.service.find_one(req=None, _id=2)['reads'])
+        self.service.invalidate_cache()
+        self.assertEqual(0, len(self.service.cache))
+
+    def test_post_invalidates_get(self):
+        self.service.find_one(req=None, _id=1)
+        self.assertEqual(1, self.service.get(req=None, lookup={}).count())
+        self.service.post([{'_id': 2}])
+        self.assertEqual(2, self.service.get(req=None, lookup={}).count())
+        self.assertEqual(1, self.service.find_one(req=None, _id=1)['reads'])
+
+    def test_invalidate_after_write(self):
+        self.service.find_one(req=None, _id=1)
+        # concurrent read while document is being written must not stay cached
+        concurrent = []
+        self.backend.on_write = lambda: concurrent.append(self.service.find_one(req=None, _id=1))
+        self.service.update(1, {}, {})
+        self.assertGreater(self.service.find_one(req=None, _id=1)['reads'], concurrent[0]['reads'])
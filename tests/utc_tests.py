@@ -9,13 +9,16 @@
 # at https://www.sourcefabric.org/eden/license
 
 
+import unittest
 from datetime import datetime, timedelta
 
+import arrow
 from nose.tools import assert_raises
 from pytz import utc  # flake8: noqa
 
 from eden.tests import TestCase
-from eden.utc import get_date, utcnow, get_expiry_date
+from eden.utc import compile_datetime_query, filter_datetimes, get_date, get_dates, utcnow, get_expiry_date, \
+    get_timezone, local_to_utc, local_to_utc_many, query_datetime, utc_to_local, utc_to_local_many
 
 
 class UTCTestCase(TestCase):
@@ -62,3 +65,70 @@ class UTCTestCase(TestCase):
         with assert_raises(TypeError) as error_context:
             offset = '01.02.2013 13:30'
             get_expiry_date(minutes=5, offset=offset)
+
+
+class GetDateTestCase(unittest.TestCase):
+
+    values = ['2012-12-12', '2012-12-12T10:11:12Z', '2012-12-12T10:11:12.123+01:00', '2012-12-12T10:11:12+0100',
+              '2012-12-12 10:11', '2012-12-12T10:11:12.1234567Z', '1565358758', 1565358758, 1565358758.5,
+              datetime(2012, 1, 1), datetime(2012, 1, 1, tzinfo=utc)]
+
+    def test_same_as_arrow(self):
+        for value in self.values:
+            date = get_date(value)
+            self.assertIsNotNone(date.tzinfo, value)
+            self.assertEqual(arrow.get(value).datetime, date, value)
+
+    def test_rfc1123(self):
+        self.assertEqual(datetime(2012, 1, 10, 10, 11, 12, tzinfo=utc), get_date('Tue, 10 Jan 2012 10:11:12 GMT'))
+
+    def test_get_dates(self):
+        values = self.values + [None, '', '2012-12-12']
+        self.assertEqual([get_date(value) for value in values], get_dates(values))
+
+
+class TimezoneTestCase(unittest.TestCase):
+
+    zones = ['Europe/Prague', 'America/New_York', 'Australia/Lord_Howe', 'Asia/Kolkata', 'UTC', 'Etc/GMT+5']
+
+    def get_datetimes(self):
+        start = datetime(1990, 1, 1, 0, 7)
+        return [start + timedelta(minutes=30 * i) for i in range(0, 2 * 24 * 365 * 30, 61)]
+
+    def test_get_timezone(self):
+        self.assertIs(get_timezone('Europe/Prague'), get_timezone('Europe/Prague'))
+
+    def test_same_as_pytz(self):
+        datetimes = self.get_datetimes() + [None]
+        for zone in self.zones:
+            self.assertEqual([local_to_utc(zone, value) for value in datetimes], local_to_utc_many(zone, datetimes))
+            local_datetimes = utc_to_local_many(zone, datetimes)
+            for expected, local_datetime in zip([utc_to_local(zone, value) for value in datetimes], local_datetimes):
+                self.assertEqual(expected, local_datetime)
+                self.assertEqual(str(expected), str(local_datetime))
+
+    def test_ambiguous_and_missing_times(self):
+        datetimes = [datetime(2019, 10, 27, 2, 30), datetime(2019, 3, 31, 2, 30)]
+        expected = [local_to_utc('Europe/Prague', value) for value in datetimes]
+        self.assertEqual(expected, local_to_utc_many('Europe/Prague', datetimes))
+        self.assertEqual([datetime(2019, 10, 27, 1, 30, tzinfo=utc), datetime(2019, 3, 31, 1, 30, tzinfo=utc)],
+                         expected)
+
+
+class QueryDatetimeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dates = [datetime(2019, 1, day, tzinfo=utc) for day in range(1, 11)]
+
+    def test_query_datetime(self):
+        self.assertTrue(query_datetime(self.dates[4], {}))
+        self.assertTrue(query_datetime(self.dates[4], {'$gte': self.dates[4], '$lt': self.dates[5]}))
+        self.assertFalse(query_datetime(self.dates[5], {'$gte': self.dates[4], '$lt': self.dates[5]}))
+        self.assertFalse(query_datetime(self.dates[4], {'$lte': self.dates[8], '$ne': self.dates[4]}))
+        self.assertFalse(query_datetime(self.dates[4], {'$gt': self.dates[1], '$eq': self.dates[5]}))
+
+    def test_compile_datetime_query(self):
+        query = {'$gt': self.dates[1], '$lte': self.dates[6], '$ne': self.dates[3], '$unknown': None}
+        check = compile_datetime_query(query)
+        self.assertEqual([d for d in self.dates if query_datetime(d, query)], [d for d in self.dates if check(d)])
+        self.assertEqual([self.dates[i] for i in (2, 4, 5, 6)], filter_datetimes(iter(self.dates), query))
@@ -1,6 +1,17 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
 import unittest
+from datetime import datetime
 
-from eden.utils import sha
+from bson import ObjectId
+from flask import Flask
+
+from eden.utils import FileSortAttributes, LazyCursor, SortOrder, StreamingJSONEncoder, check_hash, check_hash_async, \
+    check_hashes, compare_preferences, deep_compare, get_hash_async, get_hashes, get_mongo_update, get_sorted_files, \
+    iter_files, json_serialize_datetime_objectId, sha
 
 
 class UtilsTestCase(unittest.TestCase):
@@ -8,3 +19,168 @@ class UtilsTestCase(unittest.TestCase):
     def test_sha(self):
         digest = sha('some text')
         self.assertGreater(len(digest), 40)
+
+
+class HashTestCase(unittest.TestCase):
+
+    def test_get_hashes(self):
+        hashes = get_hashes(['foo', 'bar', 'foo'], 4)
+        self.assertEqual(3, len(hashes))
+        self.assertNotEqual(hashes[0], hashes[2])
+        self.assertTrue(check_hash('bar', hashes[1]))
+        self.assertEqual([True, False, True], check_hashes(zip(['foo', 'foo', 'foo'], hashes)))
+        self.assertEqual([], check_hashes([]))
+
+    def test_async(self):
+        async def hash_and_check():
+            hashed = await get_hash_async('foo', 4)
+            return await check_hash_async('foo', hashed), await check_hash_async('bar', hashed)
+
+        self.assertEqual((True, False), asyncio.run(hash_and_check()))
+
+
+class SortedFilesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        for i, name in enumerate(['b.xml', 'c.txt', 'a.xml', 'd.xml']):
+            filename = os.path.join(self.path, name)
+            with open(filename, 'w') as f:
+                f.write(name)
+            os.utime(filename, (1000 + i, 1000 - i))
+        os.mkdir(os.path.join(self.path, 'e.xml'))
+
+    def test_sort(self):
+        self.assertEqual(['a.xml', 'b.xml', 'c.txt', 'd.xml'], get_sorted_files(self.path))
+        self.assertEqual(['d.xml', 'c.txt', 'b.xml', 'a.xml'], get_sorted_files(self.path, sort_order=SortOrder.desc))
+        self.assertEqual(['d.xml', 'a.xml', 'c.txt', 'b.xml'],
+                         get_sorted_files(self.path, sort_by=FileSortAttributes.modified))
+
+    def test_limit_and_pattern(self):
+        self.assertEqual(['a.xml', 'b.xml'], get_sorted_files(self.path, limit=2))
+        self.assertEqual(['b.xml', 'a.xml'], get_sorted_files(self.path, sort_by=FileSortAttributes.modified,
+                                                              sort_order=SortOrder.desc, limit=2, pattern='*.xml'))
+        self.assertEqual(['a.xml', 'b.xml', 'd.xml'], get_sorted_files(self.path, pattern='*.xml'))
+
+    def test_iter_files(self):
+        self.assertEqual({'a.xml', 'b.xml', 'd.xml'}, {entry.name for entry in iter_files(self.path, '*.xml')})
+
+
+class StreamingJSONEncoderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['DATE_FORMAT'] = '%a, %d %b %Y %H:%M:%S GMT'
+
+    def test_iter_list(self):
+        docs = [{'_id': ObjectId(), 'created': datetime(2019, 1, 1, 10, i % 2, 0, i)} for i in range(5)]
+        with self.app.app_context():
+            encoder = StreamingJSONEncoder(chunk_size=2)
+            chunks = list(encoder.iter_list(iter(docs)))
+            self.assertEqual(json.dumps(docs, default=json_serialize_datetime_objectId), ''.join(chunks))
+            self.assertEqual(5, len(chunks))
+            self.assertEqual('[]', ''.join(encoder.iter_list([])))
+            self.assertEqual(2, len(encoder._dates))
+
+    def test_date_format_with_microseconds(self):
+        dates = [datetime(2019, 1, 1, 10, 0, 0, i) for i in range(3)]
+        with self.app.app_context():
+            encoder = StreamingJSONEncoder(date_format='%Y-%m-%dT%H:%M:%S.%f')
+            self.assertEqual(['2019-01-01T10:00:00.00000%d' % i for i in range(3)],
+                             [encoder.format_date(date) for date in dates])
+            self.assertIsNone(encoder._dates)
+
+    def test_unknown_type(self):
+        with self.app.app_context(), self.assertRaises(TypeError):
+            StreamingJSONEncoder().encode({'value': object()})
+
+
+class LazyCursorTestCase(unittest.TestCase):
+
+    def get_docs(self, read, size=10):
+        for i in range(size):
+            read.append(i)
+            yield {'_id': i, 'rank': (i * 7) % size}
+
+    def test_reads_only_needed_pages(self):
+        read = []
+        cursor = LazyCursor(self.get_docs(read, 1000), page_size=10)
+        self.assertEqual({'_id': 0, 'rank': 0}, cursor.first())
+        self.assertEqual(10, len(read))
+        self.assertEqual([15, 16], [doc['_id'] for doc in cursor[15:17]])
+        self.assertEqual(20, len(read))
+        self.assertEqual(1000, cursor.count())
+        self.assertEqual(1000, len(read))
+        self.assertEqual(list(range(1000)), [doc['_id'] for doc in cursor])
+
+    def test_skip_limit_sort(self):
+        read = []
+        cursor = LazyCursor(self.get_docs(read)).sort('rank', -1).skip(1).limit(3)
+        self.assertEqual([8, 7, 6], [doc['rank'] for doc in cursor])
+        self.assertEqual(3, cursor.count(with_limit_and_skip=True))
+        self.assertEqual(10, cursor.count())
+        with self.assertRaises(RuntimeError):
+            cursor.limit(5)
+
+        cursor = LazyCursor([{'a': 1, 'b': 2}, {'a': 2, 'b': 1}, {'a': 1, 'b': 1}, {'b': 3}])
+        cursor.sort([('a', 1), ('b', -1)])
+        self.assertEqual([{'b': 3}, {'a': 1, 'b': 2}, {'a': 1, 'b': 1}, {'a': 2, 'b': 1}], list(cursor))
+
+    def test_count_estimate(self):
+        read = []
+        cursor = LazyCursor(self.get_docs(read, 100), count=100).skip(90).limit(20)
+        self.assertEqual(100, cursor.count())
+        self.assertEqual(10, cursor.count(with_limit_and_skip=True))
+        self.assertEqual([], read)
+        self.assertIsNone(LazyCursor().first())
+        self.assertEqual(0, LazyCursor().count())
+
+    def test_count_exact_after_read(self):
+        cursor = LazyCursor(self.get_docs([], 10), count=100)
+        self.assertEqual(100, cursor.count())
+        self.assertEqual(10, len(list(cursor)))
+        self.assertEqual(10, cursor.count())
+        self.assertEqual(10, cursor.count(with_limit_and_skip=True))
+
+        cursor = LazyCursor(self.get_docs([], 10), count=100).limit(5)
+        self.assertEqual(5, len(list(cursor)))
+        self.assertEqual(100, cursor.count())
+        cursor = LazyCursor(self.get_docs([], 10), count=100).sort('rank').limit(5)
+        self.assertEqual(5, len(list(cursor)))
+        self.assertEqual(10, cursor.count())
+
+
+class DeepCompareTestCase(unittest.TestCase):
+
+    original = {'a': 1, 'b': {'c': {'d': 1, 'e': [1, 2]}, 'f': 'x'}, 'g': True, 'h': {'i': 1}}
+    updates = {'a': 1, 'b': {'c': {'d': 2, 'e': [1, 2], 'j': None}, 'f': 'x'}, 'g': 1, 'k': {'l': 1}}
+
+    def test_compare_preferences(self):
+        added, removed, modified = compare_preferences(self.original, self.updates)
+        self.assertEqual(({'k'}, {'h'}), (added, removed))
+        self.assertEqual({'b'}, set(modified))
+
+    def test_deep_compare(self):
+        added, removed, modified = compare_preferences(self.original, self.updates, deep=True)
+        self.assertEqual({'k', 'b.c.j'}, added)
+        self.assertEqual({'h'}, removed)
+        self.assertEqual({'b.c.d': (1, 2), 'g': (True, 1)}, modified)
+        self.assertEqual((set(), set(), {}), deep_compare(self.original, self.original))
+
+    def test_deep_compare_nested_types(self):
+        original = {'a': {'b': True, 'c': 1.0, 'd': [1, {'e': True}]}}
+        updates = {'a': {'b': 1, 'c': 1, 'd': [1, {'e': 1}]}}
+        self.assertEqual((set(), set(), {
+            'a.b': (True, 1),
+            'a.c': (1.0, 1),
+            'a.d': ([1, {'e': True}], [1, {'e': 1}]),
+        }), deep_compare(original, updates))
+        self.assertEqual({}, get_mongo_update(original, {'a': {'b': True, 'c': 1.0, 'd': [1, {'e': True}]}}))
+
+    def test_get_mongo_update(self):
+        self.assertEqual({
+            '$set': {'k': {'l': 1}, 'b.c.j': None, 'b.c.d': 2, 'g': 1},
+            '$unset': {'h': 1},
+        }, get_mongo_update(self.original, self.updates))
+        self.assertEqual({}, get_mongo_update(self.original, dict(self.original)))
@@ -8,7 +8,21 @@
 # AUTHORS and LICENSE files distributed with this source code, or
 # at https://www.sourcefabric.org/eden/license
 
+import json
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+from bson import ObjectId
+from eve import Eve
+from eve.io.base import DataLayer
+from eve.io.mongo.mongo import Mongo
+from flask import Flask
+
 from eden.tests import TestCase
+from eden import validator as validator_module
+from eden.validator import ERROR_PATTERN, ERROR_REQUIRED, ERROR_UNIQUE, EdenValidator, get_validation_plan, \
+    is_valid_email, parse_phone_number, validate_documents, validate_emails
 
 
 # TODO test validators
@@ -33,3 +47,375 @@ class EdenValidatorTest(TestCase):
             self.fail("Could not import class under test (EdenValidator)")
         else:
             return EdenValidator
+
+
+class FakeCursor(list):
+
+    def limit(self, limit):
+        return FakeCursor(self[:limit])
+
+
+class FakeCollection(object):
+
+    def __init__(self, existing=None):
+        self.existing = existing or []
+        self.queries = []
+
+    def find(self, query, projection=None, collation=None):
+        self.queries.append((query, collation))
+        return FakeCursor(self.existing)
+
+
+class FakeDataLayer(object):
+
+    serializers = Mongo.serializers
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.db = {'users': collection}
+
+    def datasource(self, resource):
+        return 'users', None, None, None
+
+    def pymongo(self, resource=None):
+        return self
+
+
+def get_validator_app(collection):
+    app = Flask(__name__)
+    app.config['ID_FIELD'] = '_id'
+    app.config['DOMAIN'] = {'users': {'normalize_dotted_fields': True, 'schema': {
+        'name': {'type': 'string'},
+        'parent': {'type': 'objectid'},
+    }}}
+    app.data = FakeDataLayer(collection)
+    return app
+
+
+class IUniqueTestCase(unittest.TestCase):
+
+    def get_validator(self, existing=None, _id=None):
+        self.collection = FakeCollection(existing)
+        self.ctx = get_validator_app(self.collection).app_context()
+        self.ctx.push()
+        self.addCleanup(self.ctx.pop)
+        validator = EdenValidator(schema={}, resource='users')
+        validator._id = _id
+        validator._original_document = {}
+        validator.document = {'parent': 'p1'}
+        validator._error = mock.Mock()
+        return validator
+
+    def test_iunique_uses_collation(self):
+        validator = self.get_validator()
+        validator._validate_iunique(True, 'name', ' Foo ')
+        validator._error.assert_not_called()
+        query, collation = self.collection.queries[0]
+        self.assertEqual({'name': 'Foo'}, query)
+        self.assertEqual(2, collation['strength'])
+
+    def test_iunique_error(self):
+        validator = self.get_validator(existing=[{'_id': 1}], _id='abc')
+        validator._validate_iunique(True, 'name', 'foo')
+        validator._error.assert_called_once_with('name', ERROR_UNIQUE)
+        self.assertEqual({'$ne': 'abc'}, self.collection.queries[0][0]['_id'])
+
+    def test_iunique_per_parent(self):
+        validator = self.get_validator(existing=[{'_id': 1}])
+        validator._validate_iunique_per_parent('parent', 'name', 'foo')
+        validator._error.assert_called_once_with('name', ERROR_UNIQUE)
+        self.assertEqual({'name': 'foo', 'parent': 'p1'}, self.collection.queries[0][0])
+
+
+class UniqueBatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.collection = FakeCollection([{'_id': 1, 'name': 'bob', 'parent': 'p1'}])
+        self.app = get_validator_app(self.collection)
+
+    def validate(self, payload, validate):
+        errors = []
+        with self.app.test_request_context(method='POST', json=payload):
+            validator = EdenValidator(schema={}, resource='users')
+            validator._id = None
+            validator._original_document = {}
+            for i, doc in enumerate(payload):
+                validator.document = validator._serialize(dict(doc))
+                validator._error = mock.Mock()
+                validate(validator, doc)
+                if validator._error.called:
+                    errors.append(i)
+        return errors
+
+    def test_iunique_batch(self):
+        payload = [{'name': 'alice'}, {'name': 'BOB'}, {'name': 'Alice '}, {'name': 'carol'}]
+        errors = self.validate(payload, lambda validator, doc: validator._validate_iunique(True, 'name', doc['name']))
+        self.assertEqual([1, 2], errors)
+        self.assertEqual(1, len(self.collection.queries))
+        self.assertEqual({'name': {'$in': mock.ANY}}, self.collection.queries[0][0])
+
+    def test_iunique_per_parent_batch(self):
+        payload = [{'name': 'bob', 'parent': 'p2'}, {'name': 'Bob', 'parent': 'p1'}, {'name': 'bob', 'parent': 'p2'}]
+        errors = self.validate(payload, lambda validator, doc: validator._validate_iunique_per_parent(
+            'parent', 'name', doc['name']))
+        self.assertEqual([1, 2], errors)
+        self.assertEqual(1, len(self.collection.queries))
+        self.assertEqual(2, len(self.collection.queries[0][0]['$or']))
+
+    def test_iunique_per_parent_batch_serialized(self):
+        parent = ObjectId()
+        self.collection.existing = [{'_id': 1, 'name': 'bob', 'parent': parent}]
+        payload = [{'name': 'Bob', 'parent': str(parent)}, {'name': 'alice', 'parent': str(parent)}]
+        errors = self.validate(payload, lambda validator, doc: validator._validate_iunique_per_parent(
+            'parent', 'name', doc['name']))
+        self.assertEqual([0], errors)
+        self.assertEqual(1, len(self.collection.queries))
+        self.assertEqual(parent, self.collection.queries[0][0]['parent'])
+
+    def test_iunique_batch_casefold(self):
+        self.collection.existing = [{'_id': 1, 'name': 'Straße'}]
+        payload = [{'name': 'STRASSE'}, {'name': 'strasse'}, {'name': 'street'}]
+        errors = self.validate(payload, lambda validator, doc: validator._validate_iunique(True, 'name', doc['name']))
+        self.assertEqual([0, 1], errors)
+
+
+class EmailValidationTestCase(unittest.TestCase):
+
+    def test_is_valid_email(self):
+        self.assertTrue(is_valid_email('john.doe@example.com'))
+        self.assertTrue(is_valid_email('John+tag@Example.co.uk'))
+        self.assertFalse(is_valid_email('john.doe'))
+        self.assertFalse(is_valid_email('@example.com'))
+        self.assertFalse(is_valid_email('john@'))
+        self.assertFalse(is_valid_email('john@doe@example.com'))
+        self.assertFalse(is_valid_email('%s@example.com' % ('a' * 65)))
+        self.assertFalse(is_valid_email(None))
+
+    def test_validate_emails(self):
+        self.assertEqual([True, False, True], validate_emails(['a@b.com', 'a.b.com', 'c@d.org']))
+
+    def test_multiple_emails(self):
+        validator = EdenValidator(schema={})
+        validator._error = mock.Mock()
+        validator._validate_multiple_emails(True, 'to', 'a@b.com, c@d.org')
+        validator._error.assert_not_called()
+        validator._validate_multiple_emails(True, 'to', 'a@b.com, c.d.org')
+        validator._error.assert_called_once_with('to', ERROR_PATTERN)
+
+
+class PhoneNumberTestCase(unittest.TestCase):
+
+    def setUp(self):
+        validator_module._phone_number_cache = None
+        self.app = Flask(__name__)
+        self.app.config['PHONE_NUMBER_CACHE_SIZE'] = 2
+
+    def test_parse_phone_number(self):
+        with self.app.app_context():
+            self.assertEqual((True, '+447400123456'), parse_phone_number('+44 7400 123456'))
+            self.assertEqual((False, None), parse_phone_number('not a number'))
+            self.assertEqual((False, None), parse_phone_number(None))
+
+    def test_parse_phone_number_is_cached(self):
+        parse_mock = mock.patch('phonenumbers.parse', wraps=validator_module.phonenumbers.parse)
+        with self.app.app_context(), parse_mock as parse:
+            parse_phone_number('+44 7400 123456')
+            parse_phone_number('+44 7400 123456')
+            self.assertEqual(1, parse.call_count)
+            parse_phone_number('+44 20 7946 0000')
+            parse_phone_number('+420 603 123 456')
+            cache = validator_module._phone_number_cache
+            self.assertEqual(2, len(cache))
+            self.assertEqual(1, cache.hits)
+            self.assertEqual(1, cache.evictions)
+
+    def test_statsd_counters(self):
+        statsd = mock.Mock()
+        self.app.extensions['statsd'] = statsd
+        with self.app.app_context():
+            parse_phone_number('+44 7400 123456')
+            parse_phone_number('+44 7400 123456')
+        statsd.client.incr.assert_has_calls([mock.call('phone_number_cache.miss', 1),
+                                             mock.call('phone_number_cache.hit', 1)])
+
+    def test_type_and_coercion(self):
+        validator = EdenValidator(schema={})
+        with self.app.app_context():
+            self.assertTrue(validator._validate_type_phone_number('+44 7400 123456'))
+            self.assertFalse(validator._validate_type_phone_number('+44 20 7946 0000'))
+            self.assertEqual('+447400123456', validator._normalize_coerce_phone_e164('+44 7400 123456'))
+            self.assertEqual('foo', validator._normalize_coerce_phone_e164('foo'))
+
+
+class ValidationPlanTestCase(unittest.TestCase):
+
+    schema = {
+        'name': {'type': 'string', 'required': True, 'iunique': True},
+        'parent': {'type': 'string'},
+        'code': {'type': 'string', 'required': True, 'unique': True},
+    }
+
+    def test_plan(self):
+        plan = get_validation_plan(self.schema, 'plan_test')
+        self.assertEqual({'name', 'code'}, plan.required)
+        self.assertEqual((('name', 'iunique'), ('code', 'unique')), plan.db_rules)
+        self.assertIs(plan, get_validation_plan(self.schema, 'plan_test'))
+        self.assertIsNot(plan, get_validation_plan(dict(self.schema), 'plan_test'))
+
+    def test_required_fields(self):
+        validator = EdenValidator(self.schema, resource='plan_required_test')
+        validator.ignore_none_values = True
+        validator._error = mock.Mock()
+        with mock.patch('eden.validator.ValidationPlan', wraps=validator_module.ValidationPlan) as compile_plan:
+            validator._validate_required_fields({'name': 'foo', 'code': 'bar'})
+            validator._error.assert_not_called()
+            validator._validate_required_fields({'name': 'foo', 'code': None})
+            validator._error.assert_called_once_with('code', ERROR_REQUIRED)
+            validator.ignore_none_values = False
+            validator._error.reset_mock()
+            validator._validate_required_fields({'name': 'foo', 'code': None})
+            validator._error.assert_not_called()
+
+            # plan is keyed on domain schema, not on schema of validator instance
+            other = EdenValidator(schema=self.schema, resource='plan_required_test')
+            other._error = mock.Mock()
+            other._validate_required_fields({'name': 'foo'})
+            other._error.assert_called_once_with('code', ERROR_REQUIRED)
+            self.assertIs(validator.plan, other.plan)
+            self.assertIs(self.schema, other.plan.schema)
+            self.assertLessEqual(compile_plan.call_count, 1)
+
+
+def shutdown_pool():
+    if validator_module._pool is not None:
+        validator_module._pool.shutdown()
+    validator_module._pool = validator_module._pool_size = None
+
+
+class ValidationPoolTestCase(unittest.TestCase):
+
+    schema = {
+        'name': {'type': 'string', 'iunique': True},
+        'count': {'type': 'integer'},
+    }
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.update({'VALIDATION_POOL_SIZE': 2, 'VALIDATION_POOL_THRESHOLD': 3})
+
+    def tearDown(self):
+        shutdown_pool()
+
+    def test_validate_documents(self):
+        plan = get_validation_plan(self.schema)
+        self.assertEqual({'name': {'type': 'string'}, 'count': {'type': 'integer'}}, plan.local_schema)
+        self.assertEqual({'name': {'type': 'string', 'iunique': True}}, plan.db_schema)
+        documents = [{'name': 'doc%d' % i, 'count': i if i % 3 else 'x'} for i in range(20)]
+        with self.app.app_context():
+            local = validate_documents(documents, plan.local_schema)
+            pooled = validate_documents(documents, plan.local_schema, pool_size=2)
+        self.assertEqual(local, pooled)
+        self.assertEqual([bool(i % 3) for i in range(20)], [not errors for _, errors in pooled])
+        self.assertEqual(['count'], list(pooled[0][1]))
+
+    def test_get_pool(self):
+        pool = validator_module._get_pool(2)
+        self.assertIs(pool, validator_module._get_pool(2))
+        self.assertIsNot(pool, validator_module._get_pool(1))
+
+    def test_broken_pool_is_dropped(self):
+        pool = validator_module._get_pool(2)
+        with mock.patch.object(pool, 'submit', side_effect=BrokenProcessPool()):
+            with self.assertRaises(BrokenProcessPool):
+                validate_documents([{'count': 1}], {'count': {'type': 'integer'}}, pool_size=2)
+        self.assertIsNone(validator_module._pool)
+
+    def test_bulk_post(self):
+        def validate_iunique(validator, unique, field, value):
+            checked.append(value)
+            if value == 'dup':
+                validator._error(field, 'value is not unique')
+
+        checked = []
+        payload = [{'name': 'foo', 'count': 1}, {'name': 'dup', 'count': 2},
+                   {'name': 'bar', 'count': 'x'}, {'name': 'dup', 'count': 'x'}]
+        with mock.patch.object(EdenValidator, '_validate_iunique', validate_iunique), \
+                self.app.test_request_context('/items', method='POST', json=payload):
+            payload = validator_module.request.get_json()
+            validator = EdenValidator(self.schema, resource='items')
+            results = []
+            for document in payload:
+                results.append(validator.validate(document) or validator.errors)
+            self.assertEqual(4, len(validator_module.g.get(validator_module.VALIDATION_BATCH_KEY)['items']))
+
+        self.assertEqual(True, results[0])
+        self.assertEqual(['name'], list(results[1]))
+        self.assertEqual(['count'], list(results[2]))
+        self.assertEqual(['count', 'name'], list(results[3]))
+        self.assertEqual(['foo', 'dup', 'bar', 'dup'], checked)
+
+
+class MemoryDataLayer(DataLayer):
+    """Data layer keeping inserted documents in memory."""
+
+    serializers = Mongo.serializers
+
+    def init_app(self, app):
+        self.docs = []
+
+    def insert(self, resource, docs):
+        self.docs.extend(docs)
+        return list(range(len(self.docs) - len(docs), len(self.docs)))
+
+    def is_empty(self, resource):
+        return not self.docs
+
+
+class ValidationPoolPostTestCase(unittest.TestCase):
+
+    def get_app(self, schema):
+        settings = {
+            'DOMAIN': {'items': {'schema': schema}},
+            'RESOURCE_METHODS': ['POST'],
+            'VALIDATION_POOL_SIZE': 2,
+            'VALIDATION_POOL_THRESHOLD': 2,
+        }
+        return Eve(settings=settings, data=MemoryDataLayer, validator=EdenValidator)
+
+    def tearDown(self):
+        shutdown_pool()
+
+    def post(self, app, payload):
+        with mock.patch('eden.validator.validate_documents', wraps=validate_documents) as pool_validate:
+            response = app.test_client().post('/items', data=json.dumps(payload), content_type='application/json')
+        return response, pool_validate.call_count
+
+    def test_serialized_types(self):
+        app = self.get_app({'name': {'type': 'string'}, 'when': {'type': 'datetime'}})
+        payload = [{'name': 'doc%d' % i, 'when': 'Tue, 10 Jan 2012 10:11:%02d GMT' % i} for i in range(3)]
+        response, pool_calls = self.post(app, payload)
+        self.assertEqual(201, response.status_code, response.data)
+        self.assertEqual(1, pool_calls)
+        self.assertEqual([0, 1, 2], [doc['when'].second for doc in app.data.docs])
+
+        payload[1]['when'] = 'yesterday'
+        response, _ = self.post(app, payload)
+        self.assertEqual(422, response.status_code)
+        issues = [item.get('_issues') for item in json.loads(response.data.decode('utf-8'))['_items']]
+        self.assertEqual([None, {'when': 'must be of datetime type'}, None], issues)
+
+    def test_pool_failure_falls_back(self):
+        app = self.get_app({'count': {'type': 'integer'}})
+        with mock.patch('eden.validator.validate_documents', side_effect=BrokenProcessPool()):
+            response = app.test_client().post('/items', data=json.dumps([{'count': 1}, {'count': 'x'}]),
+                                              content_type='application/json')
+        self.assertEqual(422, response.status_code, response.data)
+        issues = [item.get('_issues') for item in json.loads(response.data.decode('utf-8'))['_items']]
+        self.assertEqual([None, {'count': 'must be of integer type'}], issues)
+
+    def test_schema_with_callable(self):
+        app = self.get_app({'count': {'type': 'integer', 'coerce': lambda value: int(value)}})
+        response, pool_calls = self.post(app, [{'count': '1'}, {'count': '2'}])
+        self.assertEqual(201, response.status_code, response.data)
+        self.assertEqual(0, pool_calls)
+        self.assertEqual([1, 2], [doc['count'] for doc in app.data.docs])